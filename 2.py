@@ -1,71 +1,581 @@
-from flask import Flask, request, jsonify, render_template_string, send_from_directory
+from flask import Flask, request, jsonify, render_template_string, send_from_directory, Response, stream_with_context, g
 from dotenv import load_dotenv
-import requests, re, os, json, zipfile, secrets, datetime, threading, time, logging
+import requests, re, io, os, sys, json, queue, random, zipfile, secrets, datetime, threading, time, logging, gzip, zlib, sqlite3, hashlib, hmac, mimetypes, contextlib
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit, unquote_plus
 import pyfiglet
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from bson import ObjectId
 import telebot
 from requests.adapters import HTTPAdapter
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait, FIRST_COMPLETED
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from normalize import normie_num
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 load_dotenv()
 
 API_URL = os.getenv("API_URL")
+API_URLS = [u.strip() for u in (API_URL or "").split(",") if u.strip()]
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "neonosint")
 KEYS_COLL_NAME = "apikeys"
+KEYS_ARCHIVE_COLL_NAME = "apikeys_archive"
+META_COLL_NAME = "meta"
+QUOTA_COLL_NAME = "key_quota"
+USAGE_COLL_NAME = "key_usage"
 BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
 HOST = os.getenv("APP_HOST", "0.0.0.0")
 PORT = int(os.getenv("APP_PORT", "5000"))
 PUBLIC_URL = os.getenv("PUBLIC_URL", "")
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if PUBLIC_URL else "polling")
+BOT_WEBHOOK_PATH = "/telegram/webhook"
+BOT_ALLOWED_UPDATES = ["message", "callback_query"]
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET") or (hashlib.sha256(BOT_TOKEN.encode("utf-8")).hexdigest()[:32] if BOT_TOKEN else "")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "2"))
+BOT_QUEUE_MAX = int(os.getenv("BOT_QUEUE_MAX", "32"))
 
 UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "6"))
 CACHE_TTL = int(os.getenv("UPSTREAM_CACHE_TTL", "60"))
 THREADPOOL_MAX = int(os.getenv("THREADPOOL_MAX", "6"))
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "50"))
+CACHE_MAX_ENTRIES = int(os.getenv("UPSTREAM_CACHE_MAX_ENTRIES", "20000"))
+CACHE_MAX_BYTES = int(os.getenv("UPSTREAM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_SWEEP_INTERVAL = float(os.getenv("UPSTREAM_CACHE_SWEEP_INTERVAL", "30"))
+L2_CACHE_ENABLED = os.getenv("UPSTREAM_L2_CACHE", "1").lower() not in ("0", "false", "no", "off")
+L2_CACHE_TTL = int(os.getenv("UPSTREAM_L2_CACHE_TTL", str(CACHE_TTL)))
+L2_CACHE_COLL_NAME = "upstream_cache"
+NEG_CACHE_TTL_EMPTY = int(os.getenv("UPSTREAM_NEG_TTL_EMPTY", "30"))
+NEG_CACHE_TTL_NOT_FOUND = int(os.getenv("UPSTREAM_NEG_TTL_NOT_FOUND", "30"))
+NEG_CACHE_TTL_TIMEOUT = int(os.getenv("UPSTREAM_NEG_TTL_TIMEOUT", "5"))
+CACHE_STALE_TTL = int(os.getenv("UPSTREAM_STALE_TTL", "0"))
+DISK_CACHE_PATH = os.getenv("UPSTREAM_DISK_CACHE", "")
+DISK_CACHE_MAX_BYTES = int(os.getenv("UPSTREAM_DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+DISK_CACHE_COMPACT_INTERVAL = float(os.getenv("UPSTREAM_DISK_CACHE_COMPACT_INTERVAL", "300"))
+DISK_CACHE_WARM = int(os.getenv("UPSTREAM_DISK_CACHE_WARM", "5000"))
+DISK_CACHE_MMAP = int(os.getenv("UPSTREAM_DISK_CACHE_MMAP", str(64 * 1024 * 1024)))
+KEY_CACHE_TTL = float(os.getenv("KEY_CACHE_TTL", "30"))
+KEY_CACHE_NEG_TTL = float(os.getenv("KEY_CACHE_NEG_TTL", "5"))
+KEY_VERSION_POLL = float(os.getenv("KEY_VERSION_POLL", "2"))
+BATCH_MAX = int(os.getenv("BATCH_MAX", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+ADMISSION_QUEUE_MAX = int(os.getenv("ADMISSION_QUEUE_MAX", str(THREADPOOL_MAX * 8)))
+ADMISSION_WEB_SHARE = float(os.getenv("ADMISSION_WEB_SHARE", "0.5"))
+ADMISSION_REFRESH_SHARE = float(os.getenv("ADMISSION_REFRESH_SHARE", "0.25"))
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "10"))
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "1"))
+ADAPTIVE_TIMEOUT_FACTOR = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "2"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "1"))
+ADAPTIVE_TIMEOUT_SAMPLES = int(os.getenv("ADAPTIVE_TIMEOUT_SAMPLES", "200"))
+UPSTREAM_EWMA_ALPHA = float(os.getenv("UPSTREAM_EWMA_ALPHA", "0.3"))
+UPSTREAM_EJECT_FAILURES = int(os.getenv("UPSTREAM_EJECT_FAILURES", "5"))
+UPSTREAM_EJECT_SECONDS = float(os.getenv("UPSTREAM_EJECT_SECONDS", "30"))
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "0").lower() in ("1", "true", "yes", "on")
+UPSTREAM_HEDGE_MAX_RATIO = float(os.getenv("UPSTREAM_HEDGE_MAX_RATIO", "0.1"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", os.getenv("WEB_CONCURRENCY", "4")))
+QUOTA_SYNC_INTERVAL = float(os.getenv("QUOTA_SYNC_INTERVAL", "5"))
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+USAGE_RETENTION_DAYS = int(os.getenv("USAGE_RETENTION_DAYS", "400"))
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "5"))
+METRICS_MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1").lower() not in ("0", "false", "no", "off")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_BATCH = int(os.getenv("LOG_BATCH", "256"))
+LOG_NUM_MODE = os.getenv("LOG_NUM_MODE", "hash").lower()
+LOG_HASH_KEY = (os.getenv("LOG_HASH_KEY") or hashlib.sha256(f"neonosint-log|{MONGO_URI}".encode("utf-8")).hexdigest()).encode("utf-8")
+INDEX_CACHE_CONTROL = os.getenv("INDEX_CACHE_CONTROL", "public, max-age=300")
+ICON_CACHE_CONTROL = os.getenv("ICON_CACHE_CONTROL", "public, max-age=86400")
+KEY_SWEEP_INTERVAL = float(os.getenv("KEY_SWEEP_INTERVAL", "60"))
+KEY_RETENTION_MODE = os.getenv("KEY_RETENTION_MODE", "keep").lower()
+KEY_RETENTION_DAYS = int(os.getenv("KEY_RETENTION_DAYS", "30"))
+KEY_SWEEP_BATCH = int(os.getenv("KEY_SWEEP_BATCH", "500"))
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "20"))
+LIST_EXPIRING_DAYS = int(os.getenv("LIST_EXPIRING_DAYS", "7"))
 
 app = Flask(__name__)
 
-def exfv():
-    zip_path = os.path.join(app.root_path, "favicon_io.zip")
-    target_dir = os.path.join(app.root_path, "static/icons")
-    if not os.path.exists(zip_path):
-        return
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir, exist_ok=True)
-        with zipfile.ZipFile(zip_path, 'r') as z:
-            z.extractall(target_dir)
+class LogPipeline(logging.Handler):
+    def __init__(self, stream, sample_rate, queue_max, batch, json_lines):
+        super().__init__()
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.queue_max = queue_max
+        self.batch = batch
+        self.json_lines = json_lines
+        self._queue = queue.Queue(queue_max)
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self.dropped = 0
+        self.sampled_out = 0
 
-exfv()
+    def handle(self, record):
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        roll = getattr(record, "sample", None)
+        if roll is not None and roll >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        if self._pid != os.getpid():
+            self._write([record])
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-if not MONGO_URI:
-    raise RuntimeError("MONGO_URI not set")
+    def render(self, record):
+        if not self.json_lines:
+            return self.format(record) + "\n"
+        out = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name, "pid": record.process, "msg": record.getMessage()}
+        out.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            out["exc"] = self.formatter.formatException(record.exc_info)
+        return json.dumps(out, separators=(",", ":"), default=str) + "\n"
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-keys_col = db[KEYS_COLL_NAME]
-try:
-    keys_col.create_index("key", unique=True)
-    keys_col.create_index("name")
-except Exception:
-    pass
+    def _write(self, records):
+        with self._write_lock:
+            try:
+                self.stream.write("".join(self.render(r) for r in records))
+                self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
 
-logging.basicConfig(level=logging.INFO)
+    def flush(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if records:
+            self._write(records)
+
+    def start(self):
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        self._queue = queue.Queue(self.queue_max)
+        def loop():
+            while True:
+                records = [self._queue.get()]
+                while len(records) < self.batch:
+                    try:
+                        records.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write(records)
+        self._thread = threading.Thread(target=loop, name="log-writer", daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def stats(self):
+        return {"queued": self._queue.qsize(), "dropped": self.dropped, "sampled_out": self.sampled_out}
+
+_log_pipeline = LogPipeline(sys.stderr, LOG_SAMPLE_RATE, LOG_QUEUE_MAX, LOG_BATCH, LOG_FORMAT == "json")
+_log_pipeline.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+logging.basicConfig(level=logging.INFO, handlers=[_log_pipeline])
 logger = logging.getLogger("neonosint")
 
-session = requests.Session()
-adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50, max_retries=0)
-session.mount("http://", adapter)
-session.mount("https://", adapter)
-session.headers.update({"User-Agent": "NeonOSINT/1.0", "Accept-Encoding": "gzip, deflate"})
+def mask_num(num):
+    if not num or LOG_NUM_MODE == "plain":
+        return num
+    if LOG_NUM_MODE == "redact":
+        return num[:2] + "*" * max(0, len(num) - 4) + num[-2:]
+    return hmac.new(LOG_HASH_KEY, num.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+_SENSITIVE_QUERY = re.compile(r"((?:^|[?&])(number|numbers|apikey)=)([^&\s\"]*)")
+
+def _mask_query(match):
+    if match.group(2) == "apikey":
+        return match.group(1) + "***"
+    raw = unquote_plus(match.group(3))
+    return match.group(1) + (mask_num(normie_num(raw) or raw) or "")
+
+class AccessLogFilter(logging.Filter):
+    def filter(self, record):
+        if isinstance(record.args, dict):
+            for k, v in list(record.args.items()):
+                if isinstance(v, str):
+                    record.args[k] = _SENSITIVE_QUERY.sub(_mask_query, v)
+        elif record.args:
+            record.args = tuple(_SENSITIVE_QUERY.sub(_mask_query, a) if isinstance(a, str) else a for a in record.args)
+        elif isinstance(record.msg, str):
+            record.msg = _SENSITIVE_QUERY.sub(_mask_query, record.msg)
+        return True
+
+for _name in ("werkzeug", "uvicorn.access", "gunicorn.access"):
+    logging.getLogger(_name).addFilter(AccessLogFilter())
+
+def log_request(event, num, payload, roll=None):
+    ok = bool(payload.get("ok"))
+    masked = mask_num(num)
+    elapsed = payload.get("elapsed", 0.0)
+    logger.info("[%s] num=%s ok=%s err=%s elapsed=%.3fs", event, masked, ok, payload.get("error"), elapsed,
+                extra={"fields": {"event": event, "num": masked, "ok": ok, "error": payload.get("error"), "elapsed": elapsed},
+                       "sample": (random.random() if roll is None else roll) if ok else None})
+
+_boot_t0 = time.perf_counter()
+_boot_times = []
+
+@contextlib.contextmanager
+def _boot_phase(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _boot_times.append((name, time.perf_counter() - t0))
+
+client = None
+db = None
+keys_col = None
+meta_col = None
+quota_col = None
+usage_col = None
+session = None
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_LATENCY = Histogram("neon_upstream_latency_seconds", "Upstream call latency by outcome", ["outcome"], buckets=LATENCY_BUCKETS)
+KEY_LOOKUP_LATENCY = Histogram("neon_key_lookup_seconds", "get_key_doc latency by source", ["source"], buckets=(0.00001, 0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+REQUEST_LATENCY = Histogram("neon_request_duration_seconds", "Request duration by route", ["route", "method"], buckets=LATENCY_BUCKETS)
+REQUEST_STATUS = Counter("neon_requests_total", "Requests by route and status", ["route", "method", "status"])
+CACHE_ENTRIES = Gauge("neon_upstream_cache_entries", "Upstream L1 cache entries", multiprocess_mode="livesum")
+CACHE_BYTES = Gauge("neon_upstream_cache_bytes", "Upstream L1 cache approximate bytes", multiprocess_mode="livesum")
+CACHE_EVENTS = Counter("neon_upstream_cache_events_total", "Upstream cache events", ["tier", "event"])
+EXECUTOR_QUEUED = Gauge("neon_executor_queued", "Upstream jobs waiting for an executor thread", multiprocess_mode="livesum")
+EXECUTOR_ACTIVE = Gauge("neon_executor_active", "Upstream jobs running on executor threads", multiprocess_mode="livesum")
+EXECUTOR_WORKERS = Gauge("neon_executor_workers", "Executor thread pool size", multiprocess_mode="livesum")
+ADMISSION_REJECTED = Counter("neon_admission_rejected_total", "Upstream jobs shed by admission control", ["lane"])
+LOG_DROPPED = Counter("neon_log_records_dropped_total", "Log records not written", ["reason"])
+BREAKER_OPEN = Gauge("neon_circuit_open", "1 while the upstream circuit breaker is open", multiprocess_mode="max")
+UPSTREAM_EJECTIONS = Counter("neon_upstream_ejections_total", "Upstream endpoints ejected after consecutive failures", ["upstream"])
+UPSTREAM_HEDGES = Counter("neon_upstream_hedges_total", "Hedged upstream requests", ["result"])
+
+STARTUP_PHASE = Gauge("neon_startup_phase_seconds", "Time spent in each startup phase", ["phase"], multiprocess_mode="max")
+
+_executor = None
+
+def _payload_size(payload):
+    rendered = payload.get("rendered")
+    if rendered:
+        return 2 * sum(len(body) for body, _ in rendered.values()) + 256
+    try:
+        return len(json.dumps(payload, separators=(",", ":"), default=str)) + 64
+    except Exception:
+        return 1024
+
+class UpstreamCache:
+    def __init__(self, ttl, max_entries, max_bytes, sweep_interval, stale_ttl=0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_entry(self, key):
+        now_ts = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, payload, size, stale_until = entry
+            if now_ts >= stale_until:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if now_ts >= expires:
+                self.stale_hits += 1
+                return payload, True
+            self.hits += 1
+            return payload, False
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def set(self, key, payload, ts=None, ttl=None, stale_ttl=None, replace_ok=True):
+        size = _payload_size(payload)
+        if size > self.max_bytes:
+            return
+        now_ts = time.time()
+        expires = (now_ts if ts is None else ts) + (self.ttl if ttl is None else ttl)
+        stale_until = expires + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None and not replace_ok and old[1].get("ok") and old[3] > now_ts:
+                return
+            if old is not None:
+                del self._data[key]
+                self._bytes -= old[2]
+            self._data[key] = (expires, payload, size, stale_until)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted, _) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def sweep(self):
+        now_ts = time.time()
+        removed = 0
+        with self._lock:
+            for key in [k for k, entry in self._data.items() if entry[3] <= now_ts]:
+                self._bytes -= self._data.pop(key)[2]
+                removed += 1
+            self.expirations += removed
+        return removed
+
+    def start_sweeper(self):
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        def loop():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("[cache] sweep failed")
+        self._sweeper = threading.Thread(target=loop, name="upstream-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {"entries": len(self._data), "bytes": self._bytes, "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses, "evictions": self.evictions,
+                    "expirations": self.expirations, "hit_ratio": ((self.hits + self.stale_hits) / lookups) if lookups else 0.0}
+
+class SharedUpstreamCache:
+    def __init__(self, coll, ttl):
+        self.coll = coll
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @staticmethod
+    def fresh_query(key):
+        return {"_id": key, "expires_at": {"$gt": datetime.datetime.utcnow()}}
+
+    def decode(self, doc):
+        if not doc:
+            self.count("misses")
+            return None
+        try:
+            payload = json.loads(doc["body"])
+        except (KeyError, TypeError, ValueError):
+            self.count("errors")
+            return None
+        self.count("hits")
+        return doc.get("ts", time.time()), doc.get("ttl", self.ttl), payload
+
+    def encode(self, payload, ts, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        created = datetime.datetime.utcfromtimestamp(ts)
+        return {"body": json.dumps(payload, separators=(",", ":"), default=str), "ts": ts, "ttl": ttl, "created_at": created,
+                "expires_at": created + datetime.timedelta(seconds=ttl)}
+
+    def get(self, key):
+        try:
+            doc = self.coll.find_one(self.fresh_query(key))
+        except Exception:
+            self.count("errors")
+            return None
+        return self.decode(doc)
+
+    def set(self, key, payload, ts, ttl=None):
+        try:
+            self.coll.replace_one({"_id": key}, self.encode(payload, ts, ttl), upsert=True)
+        except Exception:
+            self.count("errors")
+            return
+        self.count("writes")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "errors": self.errors,
+                    "hit_ratio": (self.hits / lookups) if lookups else 0.0}
+
+class DiskUpstreamCache:
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS upstream (num TEXT PRIMARY KEY, ok INTEGER NOT NULL, ts REAL NOT NULL, ttl REAL NOT NULL, "
+              "stale_until REAL NOT NULL, size INTEGER NOT NULL, body BLOB NOT NULL)")
+    UPSERT = ("INSERT INTO upstream (num, ok, ts, ttl, stale_until, size, body) VALUES (?, ?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT(num) DO UPDATE SET ok = excluded.ok, ts = excluded.ts, ttl = excluded.ttl, stale_until = excluded.stale_until, "
+              "size = excluded.size, body = excluded.body WHERE excluded.ok = 1 OR upstream.ok = 0 OR upstream.stale_until <= ?")
+
+    def __init__(self, path, max_bytes, compact_interval, mmap_size):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compact_interval = compact_interval
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._compactor = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def count(self, field, n=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            conn.execute(self.SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS upstream_ts ON upstream (ts)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
 
-_executor = ThreadPoolExecutor(max_workers=THREADPOOL_MAX)
-_upstream_cache = {}
+    @staticmethod
+    def encode(payload):
+        return zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"), 6)
 
-def _fetch_upstream_raw(num, timeout):
+    def get(self, key):
+        try:
+            row = self._conn().execute("SELECT ts, ttl, body FROM upstream WHERE num = ? AND ts + ttl > ?", (key, time.time())).fetchone()
+            if row is None:
+                self.count("misses")
+                return None
+            payload = json.loads(zlib.decompress(row[2]))
+        except Exception:
+            self.count("errors")
+            return None
+        self.count("hits")
+        return row[0], row[1], payload
+
+    def set(self, key, payload, ts, ttl, stale_ttl=None):
+        stale_until = ts + ttl + (CACHE_STALE_TTL if stale_ttl is None else stale_ttl)
+        try:
+            body = self.encode(payload)
+            self._conn().execute(self.UPSERT, (key, 1 if payload.get("ok") else 0, ts, ttl, stale_until, len(body), body, time.time()))
+        except Exception:
+            self.count("errors")
+            return
+        self.count("writes")
+
+    def load_recent(self, limit):
+        rows = self._conn().execute("SELECT num, ts, ttl, body FROM upstream WHERE stale_until > ? ORDER BY ts DESC LIMIT ?",
+                                    (time.time(), limit)).fetchall()
+        out = []
+        for num, ts, ttl, body in rows:
+            try:
+                out.append((num, ts, ttl, json.loads(zlib.decompress(body))))
+            except Exception:
+                self.count("errors")
+        return out
+
+    def compact(self):
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM upstream WHERE stale_until <= ?", (time.time(),)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM upstream").fetchone()
+        if total[0] > self.max_bytes and total[1]:
+            excess = total[0] - self.max_bytes * 0.9
+            drop = max(1, int(total[1] * excess / total[0]))
+            evicted = conn.execute("DELETE FROM upstream WHERE num IN (SELECT num FROM upstream ORDER BY ts LIMIT ?)", (drop,)).rowcount
+            self.count("evictions", evicted)
+            removed += evicted
+        if removed:
+            conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def start_compactor(self):
+        if self._compactor and self._compactor.is_alive():
+            return
+        def loop():
+            while True:
+                time.sleep(self.compact_interval)
+                try:
+                    self.compact()
+                except Exception:
+                    logger.exception("[cache] disk compaction failed")
+        self._compactor = threading.Thread(target=loop, name="upstream-disk-compactor", daemon=True)
+        self._compactor.start()
+
+    def stats(self):
+        try:
+            entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM upstream").fetchone()
+        except Exception:
+            entries, size = None, None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "writes": self.writes, "errors": self.errors, "evictions": self.evictions,
+                    "hit_ratio": (self.hits / lookups) if lookups else 0.0}
+
+_upstream_cache = UpstreamCache(CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_SWEEP_INTERVAL, CACHE_STALE_TTL)
+_shared_cache = None
+_disk_cache = DiskUpstreamCache(DISK_CACHE_PATH, DISK_CACHE_MAX_BYTES, DISK_CACHE_COMPACT_INTERVAL, DISK_CACHE_MMAP) if DISK_CACHE_PATH else None
+
+def cache_stats():
+    return {"l1": _upstream_cache.stats(), "l2": _shared_cache.stats() if _shared_cache else None,
+            "l3": _disk_cache.stats() if _disk_cache else None}
+
+def _fetch_upstream_raw(num, timeout, template=None):
     if not API_URL:
         return {"ok": False, "error": "no_api_url", "elapsed": 0.0}
-    url = API_URL.format(num=num)
+    url = (template or API_URLS[0]).format(num=num)
     t0 = time.time()
     try:
         resp = session.get(url, timeout=timeout)
@@ -75,77 +585,921 @@ def _fetch_upstream_raw(num, timeout):
         return {"ok": True, "data": data, "elapsed": elapsed}
     except requests.exceptions.Timeout:
         return {"ok": False, "error": "timeout", "elapsed": time.time() - t0}
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        return {"ok": False, "error": f"request:{type(e).__name__}", "status": status, "elapsed": time.time() - t0}
     except requests.exceptions.RequestException as e:
         return {"ok": False, "error": f"request:{type(e).__name__}", "elapsed": time.time() - t0}
     except ValueError:
         return {"ok": False, "error": "invalid_json", "elapsed": time.time() - t0}
 
-def fetch_upstream(num, timeout=UPSTREAM_TIMEOUT):
+class CircuitBreaker:
+    def __init__(self, window, min_calls, failure_rate, cooldown, probes):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.probes = probes
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.opens = 0
+        self.short_circuited = 0
+        self._outcomes = deque()
+        self._failures = 0
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now_ts):
+        while self._outcomes and self._outcomes[0][0] < now_ts - self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _open(self, now_ts):
+        self.state = "open"
+        self.opened_at = now_ts
+        self.opens += 1
+        self._outcomes.clear()
+        self._failures = 0
+
+    def allow(self):
+        now_ts = time.time()
+        with self._lock:
+            if self.state == "open" and now_ts - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probing = 0
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and self._probing < self.probes:
+                self._probing += 1
+                return "probe"
+            self.short_circuited += 1
+            return False
+
+    def retry_after(self):
+        return max(1, int(self.cooldown - (time.time() - self.opened_at) + 0.999))
+
+    def record(self, failed):
+        now_ts = time.time()
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = max(0, self._probing - 1)
+                if failed:
+                    self._open(now_ts)
+                else:
+                    self.state = "closed"
+                return
+            if self.state == "open":
+                return
+            self._outcomes.append((now_ts, int(failed)))
+            self._failures += int(failed)
+            self._trim(now_ts)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+                self._open(now_ts)
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "opens": self.opens, "short_circuited": self.short_circuited,
+                    "window_calls": len(self._outcomes), "window_failures": self._failures}
+
+class LatencyTracker:
+    def __init__(self, samples, factor, floor, min_samples=20):
+        self.factor = factor
+        self.floor = floor
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=samples)
+        self._cached = None
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed):
+        with self._lock:
+            self._samples.append(elapsed)
+            self._cached = None
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, ceiling):
+        if len(self._samples) < self.min_samples:
+            return ceiling
+        if self._cached is None:
+            self._cached = self.quantile(0.99) * self.factor
+        return min(ceiling, max(self.floor, self._cached))
+
+    def hedge_delay(self):
+        if len(self._samples) < self.min_samples:
+            return None
+        return self.quantile(0.95)
+
+class UpstreamEndpoint:
+    __slots__ = ("template", "name", "ewma", "outstanding", "failures", "ejected_until", "requests", "errors", "ejections")
+
+    def __init__(self, template):
+        self.template = template
+        self.name = urlsplit(template).netloc or template
+        self.ewma = 0.0
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+class UpstreamPool:
+    def __init__(self, templates, alpha, eject_failures, eject_seconds, hedge_ratio):
+        self.endpoints = [UpstreamEndpoint(t) for t in templates]
+        self.alpha = alpha
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.hedge_ratio = hedge_ratio
+        self.routed = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def pick(self, exclude=None, hedge=False):
+        now_ts = time.time()
+        with self._lock:
+            if hedge and self.hedges >= self.hedge_ratio * self.routed + 1:
+                return None
+            healthy = [e for e in self.endpoints if e is not exclude and e.ejected_until <= now_ts]
+            if healthy:
+                chosen = min(healthy, key=lambda e: e.ewma * (e.outstanding + 1))
+            elif hedge:
+                return None
+            else:
+                others = [e for e in self.endpoints if e is not exclude]
+                if not others:
+                    return None
+                chosen = min(others, key=lambda e: e.ejected_until)
+            chosen.outstanding += 1
+            chosen.requests += 1
+            if hedge:
+                self.hedges += 1
+            else:
+                self.routed += 1
+        if hedge:
+            UPSTREAM_HEDGES.labels("fired").inc()
+        return chosen
+
+    def finish(self, endpoint, payload):
+        failed = _is_upstream_failure(payload)
+        elapsed = payload.get("elapsed", 0.0)
+        ejected = False
+        with self._lock:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.ewma = max(elapsed, endpoint.ewma * 2)
+            else:
+                endpoint.ewma = elapsed if not endpoint.ewma else endpoint.ewma + self.alpha * (elapsed - endpoint.ewma)
+            if not failed:
+                endpoint.failures = 0
+            else:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.eject_failures:
+                    endpoint.ejected_until = time.time() + self.eject_seconds
+                    endpoint.failures = self.eject_failures - 1
+                    endpoint.ejections += 1
+                    ejected = True
+        if ejected:
+            UPSTREAM_EJECTIONS.labels(endpoint.name).inc()
+            logger.warning("[upstream] ejected %s for %.0fs", endpoint.name, self.eject_seconds)
+
+    def hedge_won(self):
+        with self._lock:
+            self.hedge_wins += 1
+        UPSTREAM_HEDGES.labels("won").inc()
+
+    def stats(self):
+        now_ts = time.time()
+        with self._lock:
+            return {"routed": self.routed, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                    "endpoints": [{"name": e.name, "ewma_ms": e.ewma * 1000, "outstanding": e.outstanding, "requests": e.requests,
+                                   "errors": e.errors, "ejections": e.ejections, "ejected": e.ejected_until > now_ts} for e in self.endpoints]}
+
+_breaker = CircuitBreaker(BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_FAILURE_RATE, BREAKER_COOLDOWN, BREAKER_PROBES)
+_latency = LatencyTracker(ADAPTIVE_TIMEOUT_SAMPLES, ADAPTIVE_TIMEOUT_FACTOR, ADAPTIVE_TIMEOUT_MIN)
+_upstreams = UpstreamPool(API_URLS, UPSTREAM_EWMA_ALPHA, UPSTREAM_EJECT_FAILURES, UPSTREAM_EJECT_SECONDS, UPSTREAM_HEDGE_MAX_RATIO)
+_hedge_executor = None
+
+def _is_upstream_failure(payload):
+    if payload.get("ok") or payload.get("error") == "no_api_url":
+        return False
+    status = payload.get("status")
+    return status is None or status >= 500 or status == 429
+
+def _circuit_open():
+    return {"ok": False, "error": "circuit_open", "retry_after": _breaker.retry_after(), "elapsed": 0.0}
+
+def _upstream_timeout(admitted, ceiling):
+    return ceiling if admitted == "probe" else _latency.timeout_for(ceiling)
+
+def _record_upstream(payload, timeout):
+    UPSTREAM_LATENCY.labels("ok" if payload.get("ok") else payload.get("error", "unknown")).observe(payload.get("elapsed", 0.0))
+    _breaker.record(_is_upstream_failure(payload))
+    if payload.get("ok") or payload.get("error") == "timeout":
+        _latency.observe(min(payload.get("elapsed", 0.0), timeout))
+    return payload
+
+def _attempt(endpoint, num, timeout):
+    payload = _fetch_upstream_raw(num, timeout, endpoint.template)
+    _upstreams.finish(endpoint, payload)
+    return payload
+
+def _fetch_routed(num, timeout):
+    first = _upstreams.pick()
+    if first is None:
+        return _fetch_upstream_raw(num, timeout)
+    delay = _latency.hedge_delay() if UPSTREAM_HEDGE and _hedge_executor and len(_upstreams) > 1 else None
+    if delay is None or delay >= timeout:
+        return _attempt(first, num, timeout)
+    t0 = time.time()
+    futures = [_hedge_executor.submit(_attempt, first, num, timeout)]
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        second = _upstreams.pick(exclude=first, hedge=True)
+        if second is not None:
+            futures.append(_hedge_executor.submit(_attempt, second, num, max(0.1, timeout - delay)))
+    pending = set(futures)
+    payload = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            payload = fut.result()
+            if payload.get("ok"):
+                if fut is not futures[0]:
+                    _upstreams.hedge_won()
+                return dict(payload, elapsed=time.time() - t0)
+    return dict(payload, elapsed=time.time() - t0)
+
+def _guarded_fetch(num, timeout):
+    admitted = _breaker.allow()
+    if not admitted:
+        return _circuit_open()
+    timeout = _upstream_timeout(admitted, timeout)
+    return _record_upstream(_fetch_routed(num, timeout), timeout)
+
+def _is_empty_data(data):
+    if isinstance(data, dict):
+        return not any(k != "Channel" for k in data)
+    return data is None or (isinstance(data, list) and len(data) == 0)
+
+def _cache_policy(payload):
+    if payload.get("ok"):
+        if _is_empty_data(payload.get("data")):
+            return NEG_CACHE_TTL_EMPTY, 0
+        return CACHE_TTL, None
+    if payload.get("error") == "timeout":
+        return NEG_CACHE_TTL_TIMEOUT, 0
+    if payload.get("status") == 404:
+        return NEG_CACHE_TTL_NOT_FOUND, 0
+    return 0, 0
+
+def _promote_cached(num, hit, to_disk=False):
+    ts, ttl, payload = hit
+    stale_ttl = _cache_policy(payload)[1]
+    prepared = prepare_cached(payload)
+    _upstream_cache.set(num, prepared, ts, ttl, stale_ttl, replace_ok=stale_ttl is None)
+    if to_disk and _disk_cache:
+        _disk_cache.set(num, payload, ts, ttl, stale_ttl)
+    return prepared
+
+def warm_from_disk(limit=DISK_CACHE_WARM):
+    if not _disk_cache or limit <= 0:
+        return 0
+    rows = _disk_cache.load_recent(limit)
+    for num, ts, ttl, payload in reversed(rows):
+        _promote_cached(num, (ts, ttl, payload))
+    return len(rows)
+
+def _resolve_upstream(num, timeout):
+    if _disk_cache:
+        local = _disk_cache.get(num)
+        if local is not None:
+            return _promote_cached(num, local)
+    if _shared_cache:
+        shared = _shared_cache.get(num)
+        if shared is not None:
+            return _promote_cached(num, shared, to_disk=True)
     now_ts = time.time()
-    cached = _upstream_cache.get(num)
-    if cached:
-        ts, payload = cached
-        if now_ts - ts < CACHE_TTL:
-            return payload
-    fut = _executor.submit(_fetch_upstream_raw, num, timeout)
+    payload = _guarded_fetch(num, timeout)
+    ttl, stale_ttl = _cache_policy(payload)
+    if ttl > 0:
+        prepared = prepare_cached(payload)
+        _upstream_cache.set(num, prepared, now_ts, ttl, stale_ttl, replace_ok=stale_ttl is None)
+        if _disk_cache:
+            _disk_cache.set(num, payload, now_ts, ttl, stale_ttl)
+        if _shared_cache:
+            _shared_cache.set(num, payload, now_ts, ttl)
+        return prepared
+    return payload
+
+class AdmissionController:
+    def __init__(self, workers, queue_max, lanes, alpha=0.2, probe_interval=1.0):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.lanes = lanes
+        self.alpha = alpha
+        self.probe_interval = probe_interval
+        self._probed = {}
+        self.queued = 0
+        self.active = 0
+        self.avg_service = 0.0
+        self.admitted = {lane: 0 for lane in lanes}
+        self.rejected = {lane: 0 for lane in lanes}
+        self._lock = threading.Lock()
+
+    def estimated_wait(self):
+        if self.queued + self.active < self.workers:
+            return 0.0
+        return (self.queued + 1) / self.workers * self.avg_service
+
+    def try_admit(self, lane, deadline):
+        share = self.lanes.get(lane, 1.0)
+        now_ts = time.time()
+        with self._lock:
+            wait_s = self.estimated_wait()
+            if self.queued >= self.queue_max * share:
+                shed = True
+            elif wait_s > deadline * share:
+                shed = now_ts - self._probed.get(lane, 0.0) < self.probe_interval
+                if not shed:
+                    self._probed[lane] = now_ts
+            else:
+                shed = False
+            if shed:
+                self.rejected[lane] = self.rejected.get(lane, 0) + 1
+                return max(1, int(wait_s + 0.999))
+            self.queued += 1
+            self.admitted[lane] = self.admitted.get(lane, 0) + 1
+            return None
+
+    def started(self):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+
+    def finished(self, elapsed):
+        with self._lock:
+            self.active -= 1
+            self.avg_service += self.alpha * (elapsed - self.avg_service)
+
+    def dropped(self):
+        with self._lock:
+            self.queued -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"queued": self.queued, "active": self.active, "workers": self.workers, "avg_service": self.avg_service,
+                    "estimated_wait": self.estimated_wait(), "admitted": dict(self.admitted), "rejected": dict(self.rejected)}
+
+_admission = AdmissionController(THREADPOOL_MAX, ADMISSION_QUEUE_MAX, {"api": 1.0, "web": ADMISSION_WEB_SHARE, "refresh": ADMISSION_REFRESH_SHARE})
+
+def _run_admitted(num, timeout):
+    _admission.started()
+    t0 = time.time()
+    try:
+        return _resolve_upstream(num, timeout)
+    finally:
+        _admission.finished(time.time() - t0)
+
+def _overloaded(retry_after):
+    return {"ok": False, "error": "overloaded", "retry_after": retry_after, "elapsed": 0.0}
+
+class _Flight:
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future, waiters=1):
+        self.future = future
+        self.waiters = waiters
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _finish_flight(num, flight):
+    with _inflight_lock:
+        if _inflight.get(num) is flight:
+            del _inflight[num]
+    if flight.future.cancelled():
+        _admission.dropped()
+
+def _join_flight(num, timeout, wait=True, lane="api"):
+    with _inflight_lock:
+        flight = _inflight.get(num)
+        if flight is not None:
+            flight.waiters += 1 if wait else 0
+            return flight, None
+        retry_after = _admission.try_admit(lane, timeout + 1)
+        if retry_after is not None:
+            return None, retry_after
+        flight = _Flight(_executor.submit(_run_admitted, num, timeout), 1 if wait else 0)
+        _inflight[num] = flight
+    flight.future.add_done_callback(lambda fut: _finish_flight(num, flight))
+    return flight, None
+
+def _leave_flight(num, flight):
+    with _inflight_lock:
+        flight.waiters -= 1
+        abandoned = flight.waiters <= 0 and _inflight.get(num) is flight
+        if abandoned:
+            del _inflight[num]
+    if abandoned:
+        flight.future.cancel()
+
+def cached_upstream(num, timeout=UPSTREAM_TIMEOUT):
+    cached = _upstream_cache.get_entry(num)
+    if cached is None:
+        return None
+    payload, stale = cached
+    if stale:
+        _join_flight(num, timeout, wait=False, lane="refresh")
+    return payload
+
+def fetch_upstream_ex(num, timeout=UPSTREAM_TIMEOUT, lane="api"):
+    cached = cached_upstream(num, timeout)
+    if cached is not None:
+        return cached, True
+    flight, retry_after = _join_flight(num, timeout, lane=lane)
+    if flight is None:
+        return _overloaded(retry_after), False
     try:
-        payload = fut.result(timeout=timeout + 1)
+        return flight.future.result(timeout=timeout + 1), False
     except FuturesTimeoutError:
-        fut.cancel()
-        payload = {"ok": False, "error": "timeout", "elapsed": timeout + 1}
+        _leave_flight(num, flight)
+        return {"ok": False, "error": "timeout", "elapsed": timeout + 1}, False
     except Exception as ex:
-        payload = {"ok": False, "error": f"executor:{type(ex).__name__}", "elapsed": 0.0}
-    if payload.get("ok"):
-        _upstream_cache[num] = (now_ts, payload)
-    return payload
+        return {"ok": False, "error": f"executor:{type(ex).__name__}", "elapsed": 0.0}, False
 
-def normie_num(raw: str):
-    digits = re.sub(r"\D", "", raw)
-    if len(digits) == 10:
-        num = digits
-    elif len(digits) == 11 and digits.startswith("0"):
-        num = digits[1:]
-    elif len(digits) == 12 and digits.startswith("91"):
-        num = digits[2:]
-    elif len(digits) == 13 and digits.startswith("0091"):
-        num = digits[4:]
-    elif len(digits) > 10 and digits[-10:].startswith(("6", "7", "8", "9")):
-        num = digits[-10:]
-    else:
-        return None
-    return num if re.match(r"^[6-9]\d{9}$", num) else None
+def fetch_upstream(num, timeout=UPSTREAM_TIMEOUT, lane="api"):
+    return fetch_upstream_ex(num, timeout, lane)[0]
 
 def gen_key():
     return secrets.token_urlsafe(24)
 
-def create_key(name: str, days: int):
+LIMIT_FIELDS = ("rpm", "burst", "daily", "monthly")
+
+def parse_limit_opts(tokens):
+    limits = {}
+    for tok in tokens:
+        field, sep, value = tok.partition("=")
+        field = field.lower()
+        if not sep or field not in LIMIT_FIELDS:
+            raise ValueError(f"Unknown option: {tok}")
+        limits[field] = int(value)
+        if limits[field] < 0:
+            raise ValueError(f"{field} must be >= 0")
+    return limits
+
+def key_limits_for_name(name: str):
+    doc = keys_col.find_one({"name": name}, sort=[("created_at", -1)])
+    return {f: doc[f] for f in LIMIT_FIELDS if doc and doc.get(f)}
+
+def create_key(name: str, days: int, limits=None):
     key = gen_key()
     now = datetime.datetime.utcnow()
     exp = now + datetime.timedelta(days=days)
     doc = {"key": key, "name": name, "created_at": now, "expires_at": exp, "active": True}
+    doc.update({f: v for f, v in (limits or {}).items() if f in LIMIT_FIELDS and v})
     try:
         keys_col.insert_one(doc)
     except DuplicateKeyError:
-        return create_key(name, days)
+        return create_key(name, days, limits)
+    invalidate_keys(key)
     return doc
 
 def revoke_by_name(name: str):
     res = keys_col.update_many({"name": name, "active": True}, {"$set": {"active": False}})
+    if res.modified_count:
+        invalidate_keys()
     return res.modified_count
 
+class KeyCache:
+    def __init__(self, ttl, neg_ttl, poll_interval):
+        self.ttl = ttl
+        self.neg_ttl = neg_ttl
+        self.poll_interval = poll_interval
+        self._data = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._poller = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now_ts = time.time()
+        entry = self._data.get(key)
+        if entry is not None and now_ts < entry[0]:
+            self.hits += 1
+            return True, entry[1]
+        self.misses += 1
+        return False, None
+
+    def set(self, key, doc, generation):
+        ttl = self.ttl if doc else self.neg_ttl
+        with self._lock:
+            if generation == self.generation:
+                self._data[key] = (time.time() + ttl, doc)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self.generation += 1
+            self.invalidations += 1
+
+    def sync_version(self):
+        doc = meta_col.find_one({"_id": "keys_version"})
+        version = doc.get("v", 0) if doc else 0
+        if self._version is not None and version != self._version:
+            self.invalidate()
+        self._version = version
+
+    def start_poller(self):
+        if self._poller and self._poller.is_alive():
+            return
+        def loop():
+            while True:
+                try:
+                    self.sync_version()
+                except Exception:
+                    logger.exception("[keys] version poll failed")
+                time.sleep(self.poll_interval)
+        self._poller = threading.Thread(target=loop, name="key-cache-poller", daemon=True)
+        self._poller.start()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0}
+
+_key_cache = KeyCache(KEY_CACHE_TTL, KEY_CACHE_NEG_TTL, KEY_VERSION_POLL)
+
+def invalidate_keys(key=None):
+    _key_cache.invalidate(key)
+    try:
+        meta_col.update_one({"_id": "keys_version"}, {"$inc": {"v": 1}}, upsert=True)
+    except Exception:
+        logger.exception("[keys] version bump failed")
+
 def get_key_doc(key: str):
-    return keys_col.find_one({"key": key})
-
-def list_keys_serialized():
-    out = []
-    for d in keys_col.find({}, {"_id": 0}):
-        doc = dict(d)
-        if isinstance(doc.get("created_at"), datetime.datetime):
-            doc["created_at"] = doc["created_at"].strftime("%Y-%m-%d %H:%M UTC")
-        if isinstance(doc.get("expires_at"), datetime.datetime):
-            doc["expires_at"] = doc["expires_at"].strftime("%Y-%m-%d %H:%M UTC")
-        out.append(doc)
-    return out
+    t0 = time.perf_counter()
+    found, doc = _key_cache.get(key)
+    if found:
+        KEY_LOOKUP_LATENCY.labels("cache").observe(time.perf_counter() - t0)
+        return doc
+    generation = _key_cache.generation
+    doc = prepare_key_doc(keys_col.find_one({"key": key}))
+    _key_cache.set(key, doc, generation)
+    KEY_LOOKUP_LATENCY.labels("mongo").observe(time.perf_counter() - t0)
+    return doc
+
+def as_utc(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+def prepare_key_doc(doc):
+    if doc:
+        exp = as_utc(doc.get("expires_at"))
+        doc["expires_ts"] = exp.replace(tzinfo=datetime.timezone.utc).timestamp() if exp else None
+    return doc
+
+def normalize_key_expiry(coll):
+    ops = []
+    for d in coll.find({"expires_at": {"$type": "string"}}, {"expires_at": 1}):
+        exp = as_utc(d["expires_at"])
+        if exp:
+            ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"expires_at": exp}}))
+    if ops:
+        coll.bulk_write(ops, ordered=False)
+    return len(ops)
+
+class KeyLifecycle:
+    def __init__(self, interval, mode, retention_days, batch):
+        self.interval = interval
+        self.mode = mode if mode in ("archive", "purge") else "keep"
+        self.retention_days = retention_days
+        self.batch = batch
+        self._thread = None
+        self.deactivated = 0
+        self.archived = 0
+        self.purged = 0
+
+    def deactivate_expired(self, now):
+        res = keys_col.update_many({"active": True, "expires_at": {"$lte": now}}, {"$set": {"active": False, "deactivated_at": now}})
+        if res.modified_count:
+            self.deactivated += res.modified_count
+            invalidate_keys()
+        return res.modified_count
+
+    def retire(self, now):
+        if self.mode == "keep":
+            return 0
+        cutoff = now - datetime.timedelta(days=self.retention_days)
+        removed = 0
+        while True:
+            docs = list(keys_col.find({"active": False, "expires_at": {"$lte": cutoff}}).limit(self.batch))
+            if not docs:
+                return removed
+            ids = [d["_id"] for d in docs]
+            if self.mode == "archive":
+                archive = db[KEYS_ARCHIVE_COLL_NAME]
+                try:
+                    archive.insert_many([dict(d, archived_at=now) for d in docs], ordered=False)
+                except BulkWriteError as e:
+                    if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])) or e.details.get("writeConcernErrors"):
+                        raise
+                ids = [d["_id"] for d in archive.find({"_id": {"$in": ids}}, {"_id": 1})]
+            n = keys_col.delete_many({"_id": {"$in": ids}}).deleted_count if ids else 0
+            removed += n
+            if self.mode == "archive":
+                self.archived += n
+            else:
+                self.purged += n
+            if len(docs) < self.batch or len(ids) < len(docs):
+                return removed
+
+    def sweep(self, now=None):
+        now = now or datetime.datetime.utcnow()
+        return {"deactivated": self.deactivate_expired(now), "retired": self.retire(now)}
+
+    def start_sweeper(self):
+        if self._thread and self._thread.is_alive():
+            return
+        def loop():
+            while True:
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("[keys] expiry sweep failed")
+                time.sleep(self.interval)
+        self._thread = threading.Thread(target=loop, name="key-expiry-sweeper", daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        return {"mode": self.mode, "deactivated": self.deactivated, "archived": self.archived, "purged": self.purged}
+
+_lifecycle = KeyLifecycle(KEY_SWEEP_INTERVAL, KEY_RETENTION_MODE, KEY_RETENTION_DAYS, KEY_SWEEP_BATCH)
+
+def _next_period_start(now, period):
+    if period == "d":
+        return datetime.datetime(now.year, now.month, now.day) + datetime.timedelta(days=1)
+    return datetime.datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+
+class KeyLimiter:
+    def __init__(self, shards, sync_interval):
+        self.shards = max(1, shards)
+        self.sync_interval = sync_interval
+        self._buckets = {}
+        self._usage = {}
+        self._lock = threading.Lock()
+        self._syncer = None
+        self.limited = 0
+
+    def check(self, key, doc, cost=1):
+        now_ts = time.time()
+        now = datetime.datetime.utcnow()
+        headers = {}
+        counters = []
+        with self._lock:
+            for period, field, fmt in (("d", "daily", "%Y%m%d"), ("m", "monthly", "%Y%m")):
+                limit = doc.get(field)
+                if not limit:
+                    continue
+                cid = f"{key}:{period}:{now.strftime(fmt)}"
+                synced, pending = self._usage.get(cid, (0, 0))
+                remaining = limit - synced - pending
+                label = "Day" if period == "d" else "Month"
+                headers[f"X-Quota-Limit-{label}"] = str(limit)
+                if remaining < cost:
+                    headers[f"X-Quota-Remaining-{label}"] = str(max(0, remaining))
+                    self.limited += 1
+                    return int((_next_period_start(now, period) - now).total_seconds()) + 1, headers
+                headers[f"X-Quota-Remaining-{label}"] = str(remaining)
+                counters.append((cid, label, remaining))
+            rpm = doc.get("rpm")
+            if rpm:
+                rate = rpm / 60.0 / self.shards
+                capacity = max(1.0, (doc.get("burst") or rpm) / self.shards)
+                tokens, last = self._buckets.get(key, (capacity, now_ts))
+                tokens = min(capacity, tokens + (now_ts - last) * rate)
+                need = min(cost, capacity)
+                headers["X-RateLimit-Limit"] = str(rpm)
+                if tokens < need:
+                    self._buckets[key] = (tokens, now_ts)
+                    headers["X-RateLimit-Remaining"] = "0"
+                    headers["X-RateLimit-Reset"] = str(int((capacity - tokens) / rate) + 1)
+                    self.limited += 1
+                    return int((need - tokens) / rate) + 1, headers
+                tokens -= cost
+                self._buckets[key] = (tokens, now_ts)
+                headers["X-RateLimit-Remaining"] = str(max(0, int(tokens * self.shards)))
+                headers["X-RateLimit-Reset"] = str(int((capacity - tokens) / rate) + 1)
+            for cid, label, remaining in counters:
+                synced, pending = self._usage.get(cid, (0, 0))
+                self._usage[cid] = (synced, pending + cost)
+                headers[f"X-Quota-Remaining-{label}"] = str(remaining - cost)
+        return None, headers
+
+    def sync(self):
+        now = datetime.datetime.utcnow()
+        current = (now.strftime("%Y%m%d"), now.strftime("%Y%m"))
+        with self._lock:
+            for cid in [c for c in self._usage if c.rsplit(":", 1)[1] not in current]:
+                del self._usage[cid]
+            deltas = {cid: pending for cid, (_, pending) in self._usage.items() if pending}
+            for cid, pending in deltas.items():
+                synced, _ = self._usage[cid]
+                self._usage[cid] = (synced + pending, self._usage[cid][1] - pending)
+            tracked = list(self._usage)
+        if deltas:
+            ops = []
+            for cid, n in deltas.items():
+                keep = datetime.timedelta(days=2 if cid.split(":")[-2] == "d" else 40)
+                ops.append(UpdateOne({"_id": cid}, {"$inc": {"count": n}, "$setOnInsert": {"expires_at": now + keep}}, upsert=True))
+            try:
+                quota_col.bulk_write(ops, ordered=False)
+            except Exception:
+                with self._lock:
+                    for cid, n in deltas.items():
+                        synced, pending = self._usage.get(cid, (n, 0))
+                        self._usage[cid] = (synced - n, pending + n)
+                raise
+        if not tracked:
+            return
+        totals = {d["_id"]: d.get("count", 0) for d in quota_col.find({"_id": {"$in": tracked}})}
+        with self._lock:
+            for cid, total in totals.items():
+                if cid in self._usage:
+                    self._usage[cid] = (total, self._usage[cid][1])
+
+    def start_syncer(self):
+        if self._syncer and self._syncer.is_alive():
+            return
+        def loop():
+            while True:
+                time.sleep(self.sync_interval)
+                try:
+                    self.sync()
+                except Exception:
+                    logger.exception("[quota] sync failed")
+        self._syncer = threading.Thread(target=loop, name="key-quota-sync", daemon=True)
+        self._syncer.start()
+
+_limiter = KeyLimiter(RATE_LIMIT_SHARDS, QUOTA_SYNC_INTERVAL)
+
+USAGE_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class UsageMeter:
+    def __init__(self, flush_interval, retention_days):
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def record(self, key, name, status, cache_hit, latency=None):
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {"name": name, "count": 0, "errors": 0, "not_found": 0, "cache_hits": 0,
+                                              "latency_sum": 0.0, "lat": [0] * (len(USAGE_LATENCY_BUCKETS) + 1)}
+            entry["count"] += 1
+            if status >= 500:
+                entry["errors"] += 1
+            elif status == 404:
+                entry["not_found"] += 1
+            if cache_hit:
+                entry["cache_hits"] += 1
+            elif latency is not None:
+                entry["latency_sum"] += latency
+                i = 0
+                while i < len(USAGE_LATENCY_BUCKETS) and latency > USAGE_LATENCY_BUCKETS[i]:
+                    i += 1
+                entry["lat"][i] += 1
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = datetime.datetime.utcnow()
+        day = now.strftime("%Y-%m-%d")
+        expires = now + datetime.timedelta(days=self.retention_days)
+        ops = []
+        for key, entry in pending.items():
+            inc = {f: entry[f] for f in ("count", "errors", "not_found", "cache_hits", "latency_sum") if entry[f]}
+            inc.update({f"lat.{i}": n for i, n in enumerate(entry["lat"]) if n})
+            ops.append(UpdateOne({"_id": f"{key}:{day}"},
+                                 {"$inc": inc, "$set": {"key": key, "name": entry["name"], "day": day, "updated_at": now},
+                                  "$setOnInsert": {"expires_at": expires}}, upsert=True))
+        try:
+            usage_col.bulk_write(ops, ordered=False)
+        except Exception:
+            with self._lock:
+                for key, entry in pending.items():
+                    self._merge(key, entry)
+            raise
+        return len(ops)
+
+    def _merge(self, key, entry):
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = entry
+            return
+        for f in ("count", "errors", "not_found", "cache_hits", "latency_sum"):
+            current[f] += entry[f]
+        current["lat"] = [a + b for a, b in zip(current["lat"], entry["lat"])]
+
+    def start_flusher(self):
+        if self._flusher and self._flusher.is_alive():
+            return
+        def loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("[usage] flush failed")
+        self._flusher = threading.Thread(target=loop, name="key-usage-flush", daemon=True)
+        self._flusher.start()
+
+def top_usage(limit=10, days=1):
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    pipeline = [
+        {"$match": {"day": {"$gte": since}}},
+        {"$sort": {"day": 1}},
+        {"$group": {"_id": "$key", "name": {"$last": "$name"}, "count": {"$sum": "$count"}, "errors": {"$sum": "$errors"},
+                    "not_found": {"$sum": "$not_found"}, "cache_hits": {"$sum": "$cache_hits"}, "latency_sum": {"$sum": "$latency_sum"}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+    ]
+    return list(usage_col.aggregate(pipeline))
+
+_meter = UsageMeter(USAGE_FLUSH_INTERVAL, USAGE_RETENTION_DAYS)
+
+def _list_query(filt, now=None):
+    now = now or datetime.datetime.utcnow()
+    if filt == "a":
+        return {"active": True}
+    if filt == "i":
+        return {"active": False}
+    if filt.startswith("e"):
+        days = int(filt[1:] or LIST_EXPIRING_DAYS)
+        return {"active": True, "expires_at": {"$gt": now, "$lte": now + datetime.timedelta(days=days)}}
+    if filt.startswith("n"):
+        return {"name": filt[1:]}
+    return {}
+
+def list_keys_page(filt="", after=None, before=None, limit=LIST_PAGE_SIZE):
+    query = _list_query(filt)
+    if before:
+        query["_id"] = {"$lt": ObjectId(before)}
+    elif after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    cursor = keys_col.find(query, {"key": 1, "name": 1, "expires_at": 1, "active": 1})
+    docs = list(cursor.sort("_id", -1 if before else 1).limit(limit + 1))
+    more = len(docs) > limit
+    docs = docs[:limit]
+    if before:
+        docs.reverse()
+        return docs, more, True
+    return docs, bool(after), more
+
+def key_summary(soon_days=LIST_EXPIRING_DAYS):
+    now = datetime.datetime.utcnow()
+    soon = now + datetime.timedelta(days=soon_days)
+    live = {"$and": [{"$eq": ["$active", True]}, {"$gt": ["$expires_at", now]}]}
+    pipeline = [
+        {"$group": {"_id": "$name", "total": {"$sum": 1},
+                    "active": {"$sum": {"$cond": [live, 1, 0]}},
+                    "expired": {"$sum": {"$cond": [{"$and": [{"$eq": ["$active", True]}, {"$lte": ["$expires_at", now]}]}, 1, 0]}},
+                    "inactive": {"$sum": {"$cond": [{"$eq": ["$active", True]}, 0, 1]}},
+                    "expiring": {"$sum": {"$cond": [{"$and": [live, {"$lte": ["$expires_at", soon]}]}, 1, 0]}}}},
+        {"$group": {"_id": None, "names": {"$sum": 1}, "total": {"$sum": "$total"}, "active": {"$sum": "$active"},
+                    "expired": {"$sum": "$expired"}, "inactive": {"$sum": "$inactive"}, "expiring": {"$sum": "$expiring"}}},
+    ]
+    rows = list(keys_col.aggregate(pipeline))
+    return rows[0] if rows else {"names": 0, "total": 0, "active": 0, "expired": 0, "inactive": 0, "expiring": 0}
 
 SITE_HTML = ("""
 <!DOCTYPE html>
@@ -309,28 +1663,328 @@ downloadBtn.addEventListener("click",()=>{
 </html>
 """)
 
+class RuntimeMetrics:
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _advance(self, counter, name, value):
+        delta = value - self._last.get(name, 0)
+        if delta > 0:
+            counter.inc(delta)
+        self._last[name] = value
+
+    def publish(self):
+        with self._lock:
+            l1 = _upstream_cache.stats()
+            CACHE_ENTRIES.set(l1["entries"])
+            CACHE_BYTES.set(l1["bytes"])
+            for event in ("hits", "stale_hits", "misses", "evictions", "expirations"):
+                self._advance(CACHE_EVENTS.labels("l1", event), ("l1", event), l1[event])
+            if _shared_cache:
+                l2 = _shared_cache.stats()
+                for event in ("hits", "misses", "writes", "errors"):
+                    self._advance(CACHE_EVENTS.labels("l2", event), ("l2", event), l2[event])
+            if _disk_cache:
+                l3 = _disk_cache.stats()
+                for event in ("hits", "misses", "writes", "errors", "evictions"):
+                    self._advance(CACHE_EVENTS.labels("l3", event), ("l3", event), l3[event])
+            adm = _admission.stats()
+            EXECUTOR_QUEUED.set(adm["queued"])
+            EXECUTOR_ACTIVE.set(adm["active"])
+            EXECUTOR_WORKERS.set(adm["workers"])
+            for lane, n in adm["rejected"].items():
+                self._advance(ADMISSION_REJECTED.labels(lane), ("rejected", lane), n)
+            BREAKER_OPEN.set(1 if _breaker.state == "open" else 0)
+            logs = _log_pipeline.stats()
+            for reason in ("dropped", "sampled_out"):
+                self._advance(LOG_DROPPED.labels(reason), ("log", reason), logs[reason])
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        def loop():
+            while True:
+                try:
+                    self.publish()
+                except Exception:
+                    logger.exception("[metrics] publish failed")
+                time.sleep(self.interval)
+        self._thread = threading.Thread(target=loop, name="runtime-metrics", daemon=True)
+        self._thread.start()
+
+_runtime_metrics = RuntimeMetrics(METRICS_INTERVAL)
+
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+    g.timings = []
+    g.sample_roll = random.random()
+    init()
+
+@app.after_request
+def _observe_request(resp):
+    t0 = getattr(g, "t0", None)
+    if t0 is not None:
+        total = time.perf_counter() - t0
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.labels(route, request.method).observe(total)
+        REQUEST_STATUS.labels(route, request.method, str(resp.status_code)).inc()
+        timings = g.get("timings")
+        if timings:
+            timings.append(("total", total))
+            if SERVER_TIMING:
+                resp.headers["Server-Timing"] = ", ".join(f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in timings)
+            phases = {name: round(elapsed * 1000, 2) for name, elapsed in timings}
+            logger.info("[timing] route=%s status=%s phases_ms=%s", route, resp.status_code, phases,
+                        extra={"fields": {"event": "timing", "route": route, "status": resp.status_code, "phases_ms": phases},
+                               "sample": g.sample_roll if resp.status_code < 400 else None})
+    return resp
+
+@contextlib.contextmanager
+def timed(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.timings.append((name, time.perf_counter() - t0))
+
+def timed_fetch(num, lane):
+    t0 = time.perf_counter()
+    payload, cache_hit = fetch_upstream_ex(num, lane=lane)
+    elapsed = time.perf_counter() - t0
+    if cache_hit:
+        g.timings.append(("cache", elapsed))
+    else:
+        upstream = min(payload.get("elapsed") or 0.0, elapsed)
+        g.timings.append(("queue", elapsed - upstream))
+        g.timings.append(("upstream", upstream))
+    return payload, cache_hit
+
+class SamplingProfiler:
+    def __init__(self, interval, max_seconds):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def run(self, seconds):
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            me = threading.get_ident()
+            counts = {}
+            samples = 0
+            deadline = time.monotonic() + max(0.0, min(seconds, self.max_seconds))
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        stack = self._stack(frame)
+                        counts[stack] = counts.get(stack, 0) + 1
+                samples += 1
+                time.sleep(self.interval)
+            return samples, counts
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def folded(counts):
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+_profiler = SamplingProfiler(PROFILE_INTERVAL, PROFILE_MAX_SECONDS)
+
+@app.route("/admin/profile")
+def admin_profile():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        seconds = float(request.args.get("seconds", "10"))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    result = _profiler.run(seconds)
+    if result is None:
+        return jsonify({"error": "A profile is already running in this worker"}), 409
+    samples, counts = result
+    return Response(_profiler.folded(counts), mimetype="text/plain", headers={"X-Profile-Samples": str(samples), "X-Profile-Pid": str(os.getpid())})
+
+@app.route("/metrics")
+def metrics():
+    registry = REGISTRY
+    if METRICS_MULTIPROC:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        _runtime_metrics.publish()
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+class StaticAsset:
+    __slots__ = ("variants", "etag", "mimetype", "cache_control")
+
+    def __init__(self, body, mimetype, cache_control):
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.variants = {"identity": body}
+        compressed = {"gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli:
+            compressed["br"] = brotli.compress(body, quality=11)
+        for enc, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[enc] = data
+
+def _not_modified(asset):
+    inm = request.headers.get("If-None-Match")
+    if not inm:
+        return False
+    for tag in inm.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag[2:] if tag.startswith("W/") else tag
+        if tag.strip('"').split("-", 1)[0] == asset.etag:
+            return True
+    return False
+
+def serve_asset(asset):
+    enc = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in asset.variants and request.accept_encodings[candidate]:
+            enc = candidate
+            break
+    headers = {"ETag": f'"{asset.etag}"' if enc == "identity" else f'"{asset.etag}-{enc}"',
+               "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+    if _not_modified(asset):
+        return Response(status=304, headers=headers)
+    if enc != "identity":
+        headers["Content-Encoding"] = enc
+    return Response(asset.variants[enc], mimetype=asset.mimetype, headers=headers)
+
+def _load_icon_assets(zip_path):
+    assets = {}
+    if not os.path.exists(zip_path):
+        return assets
+    with zipfile.ZipFile(zip_path) as z:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+            name = info.filename
+            mimetype = "image/vnd.microsoft.icon" if name.endswith(".ico") else (mimetypes.guess_type(name)[0] or "application/octet-stream")
+            assets[name] = StaticAsset(z.read(info), mimetype, ICON_CACHE_CONTROL)
+    return assets
+
+with _boot_phase("assets"):
+    with app.app_context():
+        INDEX_ASSET = StaticAsset(render_template_string(SITE_HTML).encode("utf-8"), "text/html; charset=utf-8", INDEX_CACHE_CONTROL)
+    ICON_ASSETS = _load_icon_assets(os.path.join(app.root_path, "favicon_io.zip"))
+
 @app.route("/")
 def index():
-    return render_template_string(SITE_HTML)
+    return serve_asset(INDEX_ASSET)
 
 @app.route("/lookup", methods=["POST"])
 def lookup():
     raw = request.form.get("number", "")
-    num = normie_num(raw)
+    with timed("normalize"):
+        num = normie_num(raw)
     if not num:
         return jsonify({"error": "Invalid number format"}), 400
     if not API_URL:
         return jsonify({"error": "API backend not configured"}), 500
-    payload = fetch_upstream(num)
-    logger.info("[lookup] num=%s ok=%s err=%s elapsed=%.3fs", num, payload.get("ok"), payload.get("error"), payload.get("elapsed", 0.0))
-    if not payload.get("ok"):
-        return jsonify({"error": "The Neon OSINT server may be busy. Please try again.."}), 504
-    data = payload.get("data")
+    payload, _ = timed_fetch(num, "web")
+    log_request("lookup", num, payload, g.sample_roll)
+    with timed("render"):
+        body, status = render(payload, "lookup")
+        return json_bytes_response(body, status, payload)
+
+def _with_retry_after(resp, status, payload, headers=None):
+    resp.status_code = status
+    if payload.get("retry_after"):
+        resp.headers["Retry-After"] = str(payload["retry_after"])
+    if headers:
+        resp.headers.update(headers)
+    return resp
+
+def _strip_channel(data):
     if isinstance(data, dict) and "Channel" in data:
-        del data["Channel"]
+        return {k: v for k, v in data.items() if k != "Channel"}
+    return data
+
+def _lookup_result(payload):
+    if payload.get("error") in ("overloaded", "circuit_open"):
+        return {"error": "The Neon OSINT server may be busy. Please try again.."}, 503
+    if not payload.get("ok"):
+        return {"error": "The Neon OSINT server may be busy. Please try again.."}, 504
+    data = _strip_channel(payload.get("data"))
+    if (data is None) or (isinstance(data, dict) and not data) or (isinstance(data, list) and len(data) == 0):
+        return {"error": "No data found"}, 404
+    return data, 200
+
+def encode_json(body):
+    return (app.json.dumps(body, separators=(",", ":")) + "\n").encode("utf-8")
+
+def render(payload, shape):
+    rendered = payload.get("rendered")
+    if rendered is not None:
+        return rendered[shape]
+    body, status = RENDERERS[shape](payload)
+    return encode_json(body), status
+
+def prepare_cached(payload):
+    prepared = dict(payload)
+    if prepared.get("ok"):
+        prepared["data"] = _strip_channel(prepared.get("data"))
+    prepared["rendered"] = {shape: render(prepared, shape) for shape in RENDERERS}
+    return prepared
+
+def json_bytes_response(body, status, payload, headers=None):
+    return _with_retry_after(Response(body, mimetype="application/json"), status, payload, headers)
+
+KEY_INACTIVE = ({"error": "Invalid or inactive API key"}, 401)
+KEY_EXPIRED = ({"error": "The api key is expired, DM @UseSir for new api key"}, 401)
+
+def _key_denial(doc):
+    if not doc or not doc.get("active", False):
+        return KEY_INACTIVE
+    exp_ts = doc.get("expires_ts")
+    if exp_ts is not None and exp_ts < time.time():
+        return KEY_EXPIRED
+    return None
+
+def _check_api_key(key):
+    doc = get_key_doc(key)
+    return doc, _key_denial(doc)
+
+def _rate_limited(retry_after, headers):
+    resp = jsonify({"error": "Rate limit or quota exceeded. Contact @UseSir to upgrade."})
+    return _with_retry_after(resp, 429, {"retry_after": retry_after}, headers)
+
+def _api_result(payload):
+    if payload.get("error") in ("overloaded", "circuit_open"):
+        return {"error": "Server is busy, please try again later. Details By: @UseSir"}, 503
+    if not payload.get("ok"):
+        if payload.get("error") == "timeout":
+            return {"error": "Server is busy, please try again later. Details By: @UseSir"}, 504
+        return {"error": "Upstream API error. Contact @UseSir for support."}, 502
+    data = _strip_channel(payload.get("data"))
     if (data is None) or (isinstance(data, dict) and not data) or (isinstance(data, list) and len(data) == 0):
-        return jsonify({"error": "No data found"}), 404
-    return jsonify(data)
+        return {"error": "No data found. Details By: @UseSir"}, 404
+    return {"Details By": "@UseSir", "data": data, "Footer": "Details By: @UseSir"}, 200
+
+RENDERERS = {"lookup": _lookup_result, "api": _api_result}
 
 @app.route("/number-to-info", methods=["GET"])
 def number_to_info():
@@ -340,45 +1994,142 @@ def number_to_info():
         return jsonify({"error": "Missing apikey"}), 400
     if not raw_number:
         return jsonify({"error": "Missing number parameter"}), 400
-    doc = get_key_doc(key)
-    if not doc or not doc.get("active", False):
-        return jsonify({"error": "Invalid or inactive API key"}), 401
-    now = datetime.datetime.utcnow()
-    exp = doc.get("expires_at")
-    if isinstance(exp, str):
-        try:
-            exp = datetime.datetime.fromisoformat(exp)
-        except Exception:
-            exp = None
-    if exp and exp < now:
-        keys_col.update_one({"key": key}, {"$set": {"active": False}})
-        return jsonify({"error": "The api key is expired, DM @UseSir for new api key"}), 401
-    num = normie_num(raw_number)
+    with timed("key"):
+        doc, denied = _check_api_key(key)
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    with timed("normalize"):
+        num = normie_num(raw_number)
     if not num:
         return jsonify({"error": "Invalid number format"}), 400
     if not API_URL:
         return jsonify({"error": "API backend not configured"}), 500
-    payload = fetch_upstream(num)
-    logger.info("[api] num=%s ok=%s err=%s elapsed=%.3fs", num, payload.get("ok"), payload.get("error"), payload.get("elapsed", 0.0))
-    if not payload.get("ok"):
-        if payload.get("error") == "timeout":
-            return jsonify({"error": "Server is busy, please try again later. Details By: @UseSir"}), 504
-        return jsonify({"error": "Upstream API error. Contact @UseSir for support."}), 502
-    data = payload.get("data")
-    if isinstance(data, dict) and "Channel" in data:
-        del data["Channel"]
-    if (data is None) or (isinstance(data, dict) and not data) or (isinstance(data, list) and len(data) == 0):
-        return jsonify({"error": "No data found. Details By: @UseSir"}), 404
-    wrapped = {"Details By": "@UseSir", "data": data, "Footer": "Details By: @UseSir"}
-    return jsonify(wrapped)
+    with timed("limit"):
+        retry_after, limit_headers = _limiter.check(key, doc)
+    if retry_after:
+        return _rate_limited(retry_after, limit_headers)
+    payload, cache_hit = timed_fetch(num, "api")
+    log_request("api", num, payload, g.sample_roll)
+    with timed("render"):
+        body, status = render(payload, "api")
+        resp = json_bytes_response(body, status, payload, limit_headers)
+    _meter.record(key, doc.get("name"), status, cache_hit, payload.get("elapsed"))
+    return resp
+
+def _batch_numbers():
+    if request.method == "POST" and request.is_json:
+        body = request.get_json(silent=True) or {}
+        raw = body.get("numbers") if isinstance(body, dict) else body
+        if isinstance(raw, list):
+            return [str(n) for n in raw]
+        return None
+    raw = request.values.get("numbers", "")
+    return [n for n in re.split(r"[,\s]+", raw) if n]
+
+def _ndjson(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def _batch_line(num, inputs, payload):
+    body, status = _api_result(payload)
+    line = {"number": num, "inputs": inputs, "status": status, **body}
+    if payload.get("retry_after"):
+        line["retry_after"] = payload["retry_after"]
+    return _ndjson(line)
+
+def _stream_batch(valid, timeout):
+    pending = {}
+    todo = list(valid.items())
+    todo.reverse()
+    while todo or pending:
+        while todo and len(pending) < BATCH_CONCURRENCY:
+            num, inputs = todo.pop()
+            flight, retry_after = _join_flight(num, timeout, lane="api")
+            if flight is None:
+                yield num, inputs, _overloaded(retry_after)
+                continue
+            pending[flight.future] = (num, inputs, flight, time.time() + timeout + 1)
+        if not pending:
+            continue
+        deadline = min(item[3] for item in pending.values())
+        done, _ = wait(list(pending), timeout=max(0.0, deadline - time.time()), return_when=FIRST_COMPLETED)
+        for fut in done:
+            num, inputs, _, _ = pending.pop(fut)
+            try:
+                payload = fut.result()
+            except Exception as ex:
+                payload = {"ok": False, "error": f"executor:{type(ex).__name__}", "elapsed": 0.0}
+            yield num, inputs, payload
+        now_ts = time.time()
+        for fut in [f for f, item in pending.items() if item[3] <= now_ts]:
+            num, inputs, flight, _ = pending.pop(fut)
+            _leave_flight(num, flight)
+            yield num, inputs, {"ok": False, "error": "timeout", "elapsed": timeout + 1}
+
+@app.route("/number-to-info/batch", methods=["GET", "POST"])
+def number_to_info_batch():
+    key = request.values.get("apikey", "")
+    if not key:
+        return jsonify({"error": "Missing apikey"}), 400
+    raw_numbers = _batch_numbers()
+    if not raw_numbers:
+        return jsonify({"error": "Missing numbers parameter"}), 400
+    if len(raw_numbers) > BATCH_MAX:
+        return jsonify({"error": f"Too many numbers, max {BATCH_MAX} per request"}), 413
+    doc, denied = _check_api_key(key)
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    if not API_URL:
+        return jsonify({"error": "API backend not configured"}), 500
+    valid = {}
+    invalid = []
+    for raw in raw_numbers:
+        num = normie_num(raw)
+        if num:
+            valid.setdefault(num, []).append(raw)
+        else:
+            invalid.append(raw)
+    logger.info("[batch] total=%d unique=%d invalid=%d", len(raw_numbers), len(valid), len(invalid))
+    quota = min((doc[f] for f in ("daily", "monthly") if doc.get(f)), default=None)
+    if quota and len(valid) > quota:
+        return jsonify({"error": f"Too many numbers, this key's quota is {quota}"}), 413
+    retry_after, limit_headers = _limiter.check(key, doc, max(1, len(valid)))
+    if retry_after:
+        return _rate_limited(retry_after, limit_headers)
+    def generate():
+        for raw in invalid:
+            yield _ndjson({"number": None, "inputs": [raw], "status": 400, "error": "Invalid number format"})
+        misses = {}
+        for num, inputs in valid.items():
+            payload = cached_upstream(num)
+            if payload is None:
+                misses[num] = inputs
+            else:
+                _meter.record(key, doc.get("name"), render(payload, "api")[1], True)
+                yield _batch_line(num, inputs, payload)
+        for num, inputs, payload in _stream_batch(misses, UPSTREAM_TIMEOUT):
+            _meter.record(key, doc.get("name"), _api_result(payload)[1], False, payload.get("elapsed"))
+            yield _batch_line(num, inputs, payload)
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson", headers=limit_headers)
 
 @app.route("/favicon.ico")
 def favicon():
-    return send_from_directory(os.path.join(app.root_path, "static/icons"), "favicon.ico", mimetype="image/vnd.microsoft.icon")
+    asset = ICON_ASSETS.get("favicon.ico")
+    if asset is None:
+        return send_from_directory(os.path.join(app.root_path, "static/icons"), "favicon.ico", mimetype="image/vnd.microsoft.icon")
+    return serve_asset(asset)
+
+@app.route("/static/icons/<path:name>")
+def icon(name):
+    asset = ICON_ASSETS.get(name)
+    if asset is None:
+        return send_from_directory(os.path.join(app.root_path, "static/icons"), name)
+    return serve_asset(asset)
 
 bot = None
 if BOT_TOKEN:
-    bot = telebot.TeleBot(BOT_TOKEN)
+    bot = telebot.TeleBot(BOT_TOKEN, threaded=BOT_MODE != "webhook")
+_bot_executor = None
+_bot_slots = None
 
 def is_admin(uid: int):
     return ADMIN_ID and uid == ADMIN_ID
@@ -393,7 +2144,7 @@ def build_public_base():
 if bot:
     @bot.message_handler(commands=['help'])
     def handle_help(message):
-        bot.send_message(message.chat.id, "Commands:\n/genkey <name> <days>\n/list\n/rework <name>\n/delkey <key-or-name>\n/help")
+        bot.send_message(message.chat.id, "Commands:\n/genkey <name> <days> [rpm=N] [burst=N] [daily=N] [monthly=N]\n/list [active|inactive|expiring [days]|name <name>|summary]\n/rework <name>\n/delkey <key-or-name>\n/top [n] [days]\n/profile [seconds]\n/help")
     @bot.message_handler(commands=["start"])
     def handle_start(message):
         bot.send_message(message.chat.id, "welcome @UseSir \nbot is Alice, Use /help for commands")
@@ -402,17 +2153,27 @@ if bot:
         if not is_admin(message.from_user.id):
             bot.reply_to(message, "Unauthorized.")
             return
-        docs = list_keys_serialized()
-        if not docs:
-            bot.reply_to(message, "No keys found.")
-            return
-        lines = []
-        for d in docs:
-            lines.append(f"Name: {d.get('name')} | Key: `{d.get('key')}` | Expires: {d.get('expires_at')} | Active: {d.get('active')}")
-        text = "\n".join(lines)
-        chunk_size = 3500
-        for i in range(0, len(text), chunk_size):
-            bot.send_message(message.chat.id, text[i:i+chunk_size], parse_mode='Markdown')
+        parts = message.text.split()[1:]
+        mode = parts[0].lower() if parts else ""
+        if mode == "summary":
+            summary = key_summary()
+            bot.send_message(message.chat.id, (f"Keys: {summary['total']} across {summary['names']} name(s)\nActive: {summary['active']}\n"
+                                               f"Expiring in {LIST_EXPIRING_DAYS}d: {summary['expiring']}\nExpired: {summary['expired']}\nInactive: {summary['inactive']}"))
+            return
+        if mode in ("", "all"):
+            filt = ""
+        elif mode == "active":
+            filt = "a"
+        elif mode == "inactive":
+            filt = "i"
+        elif mode == "expiring" and (len(parts) < 2 or parts[1].isdigit()):
+            filt = "e" + (parts[1] if len(parts) > 1 else "")
+        elif mode == "name" and len(parts) > 1:
+            filt = "n" + parts[1]
+        else:
+            bot.reply_to(message, "Usage: /list [active|inactive|expiring [days]|name <name>|summary]")
+            return
+        send_key_page(message.chat.id, filt)
     @bot.message_handler(commands=['genkey'])
     def handle_genkey(message):
         if not is_admin(message.from_user.id):
@@ -420,7 +2181,7 @@ if bot:
             return
         parts = message.text.split()
         if len(parts) < 3:
-            bot.reply_to(message, "Usage: /genkey <name> <days>")
+            bot.reply_to(message, "Usage: /genkey <name> <days> [rpm=N] [burst=N] [daily=N] [monthly=N]")
             return
         name = parts[1]
         try:
@@ -428,13 +2189,19 @@ if bot:
         except ValueError:
             bot.reply_to(message, "Days must be an integer.")
             return
-        doc = create_key(name, days)
+        try:
+            limits = parse_limit_opts(parts[3:])
+        except ValueError as ex:
+            bot.reply_to(message, f"{ex}. Options: rpm=N burst=N daily=N monthly=N")
+            return
+        doc = create_key(name, days, limits)
         exp = doc.get("expires_at")
         exp_s = exp.strftime("%Y-%m-%d %H:%M UTC")
         base = build_public_base()
         api_full = f"{base}/number-to-info?apikey={doc.get('key')}&number=<num>"
         example = f"{base}/number-to-info?apikey={doc.get('key')}&number=9123456789"
-        msg = (f"Key generated for `{name}`\n\nKey: `{doc.get('key')}`\nExpires: {exp_s}\n\nAPI Format:\n{api_full}\n\nExample:\n{example}\n")
+        limits_s = ", ".join(f"{f}={doc[f]}" for f in LIMIT_FIELDS if doc.get(f)) or "unlimited"
+        msg = (f"Key generated for `{name}`\n\nKey: `{doc.get('key')}`\nExpires: {exp_s}\nLimits: {limits_s}\n\nAPI Format:\n{api_full}\n\nExample:\n{example}\n")
         bot.send_message(message.chat.id, msg, parse_mode='Markdown')
     @bot.message_handler(commands=['rework'])
     def handle_rework(message):
@@ -446,8 +2213,9 @@ if bot:
             bot.reply_to(message, "Usage: /rework <name>")
             return
         name = parts[1]
+        limits = key_limits_for_name(name)
         deactivated = revoke_by_name(name)
-        doc = create_key(name, 30)
+        doc = create_key(name, 30, limits)
         exp = doc.get("expires_at")
         exp_s = exp.strftime("%Y-%m-%d %H:%M UTC") if isinstance(exp, datetime.datetime) else str(exp)
         base = build_public_base()
@@ -455,6 +2223,50 @@ if bot:
         curl_example = f"curl \"{base}/number-to-info?apikey={doc.get('key')}&number=9123456789\""
         msg = (f"Reworked `{name}`\n\nDeactivated: {deactivated} key(s)\nNew Key: `{doc.get('key')}`\nExpires: {exp_s}\n\nAPI (GET): {api_example_link}\n\ncurl example:\n{curl_example}\n")
         bot.send_message(message.chat.id, msg, parse_mode='Markdown')
+    @bot.message_handler(commands=['profile'])
+    def handle_profile(message):
+        if not is_admin(message.from_user.id):
+            bot.reply_to(message, "Unauthorized.")
+            return
+        parts = message.text.split()
+        try:
+            seconds = float(parts[1]) if len(parts) > 1 else 10.0
+        except ValueError:
+            bot.reply_to(message, "Usage: /profile [seconds]")
+            return
+        result = _profiler.run(seconds)
+        if result is None:
+            bot.reply_to(message, "A profile is already running in this worker.")
+            return
+        samples, counts = result
+        dump = io.BytesIO(_profiler.folded(counts).encode("utf-8"))
+        dump.name = f"profile-{os.getpid()}.folded"
+        bot.send_document(message.chat.id, dump, caption=f"{samples} samples from pid {os.getpid()}")
+    @bot.message_handler(commands=['top'])
+    def handle_top(message):
+        if not is_admin(message.from_user.id):
+            bot.reply_to(message, "Unauthorized.")
+            return
+        parts = message.text.split()
+        try:
+            limit = int(parts[1]) if len(parts) > 1 else 10
+            days = int(parts[2]) if len(parts) > 2 else 1
+        except ValueError:
+            bot.reply_to(message, "Usage: /top [n] [days]")
+            return
+        _meter.flush()
+        rows = top_usage(max(1, min(limit, 50)), max(1, days))
+        if not rows:
+            bot.reply_to(message, "No usage recorded.")
+            return
+        lines = [f"Top {len(rows)} keys, last {days} day(s):"]
+        for r in rows:
+            count = r.get("count", 0)
+            misses = count - r.get("cache_hits", 0)
+            hit_pct = 100.0 * r.get("cache_hits", 0) / count if count else 0.0
+            avg_ms = 1000.0 * r.get("latency_sum", 0.0) / misses if misses else 0.0
+            lines.append(f"{r.get('name')} | `{r.get('_id')}` | {count} req | {r.get('errors', 0)} err | {hit_pct:.0f}% hit | {avg_ms:.0f}ms avg")
+        bot.send_message(message.chat.id, "\n".join(lines), parse_mode='Markdown')
     @bot.message_handler(commands=['delkey'])
     def handle_delkey(message):
         if not is_admin(message.from_user.id):
@@ -467,18 +2279,101 @@ if bot:
         target = parts[1].strip()
         res_key = keys_col.delete_one({"key": target})
         if res_key.deleted_count:
+            invalidate_keys(target)
             bot.send_message(message.chat.id, f"Deleted key `{target}` (1 key removed).", parse_mode='Markdown')
-            handle_list(message)
+            send_key_page(message.chat.id)
             return
         res_name = keys_col.delete_many({"name": target})
         if res_name.deleted_count:
+            invalidate_keys()
             bot.send_message(message.chat.id, f"Deleted {res_name.deleted_count} key(s) with name `{target}`.", parse_mode='Markdown')
-            handle_list(message)
+            send_key_page(message.chat.id)
         else:
             bot.send_message(message.chat.id, "No matching key or name found.", parse_mode='Markdown')
 
+def _fmt_dt(value):
+    return value.strftime("%Y-%m-%d %H:%M UTC") if isinstance(value, datetime.datetime) else str(value)
+
+def _key_page(filt, after=None, before=None):
+    docs, has_prev, has_next = list_keys_page(filt, after, before)
+    if not docs:
+        return "No keys found.", None
+    lines = [f"Name: {d.get('name')} | Key: `{d.get('key')}` | Expires: {_fmt_dt(d.get('expires_at'))} | Active: {d.get('active')}" for d in docs]
+    buttons = []
+    if has_prev:
+        buttons.append(telebot.types.InlineKeyboardButton("« Prev", callback_data=f"ls:p:{docs[0]['_id']}:{filt}"))
+    if has_next:
+        buttons.append(telebot.types.InlineKeyboardButton("Next »", callback_data=f"ls:n:{docs[-1]['_id']}:{filt}"))
+    buttons = [b for b in buttons if len(b.callback_data.encode("utf-8")) <= 64]
+    markup = None
+    if buttons:
+        markup = telebot.types.InlineKeyboardMarkup()
+        markup.row(*buttons)
+    return "\n".join(lines), markup
+
+def send_key_page(chat_id, filt=""):
+    text, markup = _key_page(filt)
+    bot.send_message(chat_id, text, parse_mode='Markdown', reply_markup=markup)
+
+if bot:
+    @bot.callback_query_handler(func=lambda call: (call.data or "").startswith("ls:"))
+    def handle_list_page(call):
+        if not is_admin(call.from_user.id):
+            bot.answer_callback_query(call.id, "Unauthorized.")
+            return
+        _, direction, cursor, filt = call.data.split(":", 3)
+        if direction == "p":
+            text, markup = _key_page(filt, before=cursor)
+        else:
+            text, markup = _key_page(filt, after=cursor)
+        bot.edit_message_text(text, call.message.chat.id, call.message.message_id, parse_mode='Markdown', reply_markup=markup)
+        bot.answer_callback_query(call.id)
+
+def _process_update(update):
+    try:
+        bot.process_new_updates([update])
+    except Exception:
+        logger.exception("[bot] update %s failed", update.update_id)
+
+@app.route(BOT_WEBHOOK_PATH, methods=["POST"])
+def telegram_webhook():
+    if not bot or BOT_MODE != "webhook":
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), BOT_WEBHOOK_SECRET):
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        update = telebot.types.Update.de_json(request.get_data(as_text=True))
+    except Exception:
+        return jsonify({"error": "Invalid update"}), 400
+    if update is None:
+        return jsonify({"error": "Invalid update"}), 400
+    if not _bot_slots.acquire(blocking=False):
+        return _with_retry_after(jsonify({"error": "Bot busy"}), 503, {"retry_after": 1})
+    _bot_executor.submit(_process_update, update).add_done_callback(lambda f: _bot_slots.release())
+    return "", 200
+
+def register_webhook():
+    url = build_public_base() + BOT_WEBHOOK_PATH
+    max_connections = BOT_WORKERS + BOT_QUEUE_MAX
+    fingerprint = hashlib.sha256(json.dumps([url, BOT_WEBHOOK_SECRET, BOT_ALLOWED_UPDATES, max_connections]).encode()).hexdigest()
+    info = bot.get_webhook_info()
+    stored = meta_col.find_one({"_id": "bot_webhook"}) or {}
+    if (info.url == url and not info.last_error_message and sorted(info.allowed_updates or []) == sorted(BOT_ALLOWED_UPDATES)
+            and stored.get("fingerprint") == fingerprint):
+        return False
+    bot.set_webhook(url, secret_token=BOT_WEBHOOK_SECRET, allowed_updates=BOT_ALLOWED_UPDATES, max_connections=max_connections)
+    meta_col.update_one({"_id": "bot_webhook"}, {"$set": {"fingerprint": fingerprint, "updated_at": datetime.datetime.utcnow()}}, upsert=True)
+    logger.info("[bot] webhook registered at %s", url)
+    return True
+
+def _register_webhook_safe():
+    try:
+        register_webhook()
+    except Exception:
+        logger.exception("[bot] webhook registration failed")
+
 def start_bot():
-    if not bot:
+    if not bot or BOT_MODE == "webhook":
         return
     try:
         bot.delete_webhook(drop_pending_updates=True)
@@ -499,8 +2394,101 @@ def start_bot():
     t = threading.Thread(target=target, daemon=True)
     t.start()
 
+_boot_times.append(("import", time.perf_counter() - _boot_t0))
+
+def ensure_indexes(database):
+    try:
+        database[KEYS_COLL_NAME].create_index("key", unique=True)
+        database[KEYS_COLL_NAME].create_index([("name", 1), ("_id", 1)])
+        database[KEYS_COLL_NAME].create_index([("active", 1), ("_id", 1)])
+        database[KEYS_COLL_NAME].create_index([("active", 1), ("expires_at", 1)])
+        database[QUOTA_COLL_NAME].create_index("expires_at", expireAfterSeconds=0)
+        database[USAGE_COLL_NAME].create_index([("day", 1), ("count", -1)])
+        database[USAGE_COLL_NAME].create_index("expires_at", expireAfterSeconds=0)
+        if L2_CACHE_ENABLED:
+            database[L2_CACHE_COLL_NAME].create_index("expires_at", expireAfterSeconds=0)
+    except Exception:
+        logger.exception("[setup] index creation failed")
+
+def setup():
+    if not MONGO_URI:
+        raise RuntimeError("MONGO_URI not set")
+    with _boot_phase("indexes"):
+        setup_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+        try:
+            ensure_indexes(setup_client[DB_NAME])
+            normalize_key_expiry(setup_client[DB_NAME][KEYS_COLL_NAME])
+        finally:
+            setup_client.close()
+
+_init_lock = threading.Lock()
+_init_pid = None
+
+def init():
+    global client, db, keys_col, meta_col, quota_col, usage_col, session, _executor, _hedge_executor, _shared_cache, _bot_executor, _bot_slots, _init_pid
+    if _init_pid == os.getpid():
+        return
+    with _init_lock:
+        if _init_pid == os.getpid():
+            return
+        if not MONGO_URI:
+            raise RuntimeError("MONGO_URI not set")
+        _boot_times[:] = [(name, elapsed) for name, elapsed in _boot_times if name in ("import", "assets", "indexes")]
+        with _boot_phase("mongo"):
+            client = MongoClient(MONGO_URI)
+            db = client[DB_NAME]
+            keys_col = db[KEYS_COLL_NAME]
+            meta_col = db[META_COLL_NAME]
+            quota_col = db[QUOTA_COLL_NAME]
+            usage_col = db[USAGE_COLL_NAME]
+            _shared_cache = SharedUpstreamCache(db[L2_CACHE_COLL_NAME], L2_CACHE_TTL) if L2_CACHE_ENABLED else None
+        with _boot_phase("session"):
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_SIZE, pool_maxsize=UPSTREAM_POOL_SIZE, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"User-Agent": "NeonOSINT/1.0", "Accept-Encoding": "gzip, deflate"})
+        with _boot_phase("executor"):
+            _executor = ThreadPoolExecutor(max_workers=THREADPOOL_MAX)
+            if UPSTREAM_HEDGE and len(_upstreams) > 1:
+                _hedge_executor = ThreadPoolExecutor(max_workers=THREADPOOL_MAX * 2, thread_name_prefix="hedge")
+            if bot and BOT_MODE == "webhook":
+                _bot_executor = ThreadPoolExecutor(max_workers=BOT_WORKERS, thread_name_prefix="bot")
+                _bot_slots = threading.BoundedSemaphore(BOT_WORKERS + BOT_QUEUE_MAX)
+                _bot_executor.submit(_register_webhook_safe)
+        if _disk_cache:
+            with _boot_phase("warm"):
+                try:
+                    warm_from_disk()
+                except Exception:
+                    logger.exception("[cache] disk warm-up failed")
+        with _boot_phase("threads"):
+            _log_pipeline.start()
+            _upstream_cache.start_sweeper()
+            _key_cache.start_poller()
+            _limiter.start_syncer()
+            _meter.start_flusher()
+            _lifecycle.start_sweeper()
+            if _disk_cache:
+                _disk_cache.start_compactor()
+            _runtime_metrics.start()
+        _init_pid = os.getpid()
+    startup_report()
+
+def startup_report():
+    for name, elapsed in _boot_times:
+        STARTUP_PHASE.labels(name).set(elapsed)
+    logger.info("[startup] pid=%s %s", os.getpid(), " ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in _boot_times))
+    return list(_boot_times)
+
 if __name__ == "__main__":
+    if sys.argv[1:] == ["setup"]:
+        setup()
+        startup_report()
+        sys.exit(0)
     ascii_art = pyfiglet.figlet_format("INDia", font="isometric1")
     print(ascii_art)
+    init()
+    ensure_indexes(db)
     start_bot()
     app.run(host=HOST, port=PORT, threaded=True)
\ No newline at end of file
@@ -0,0 +1,216 @@
+import asyncio, importlib, os, time
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+import httpx
+from pymongo import AsyncMongoClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route, Mount
+from a2wsgi import WSGIMiddleware
+
+core = importlib.import_module("2")
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "1000"))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("ASYNC_MAX_KEEPALIVE", "100"))
+
+http = None
+mongo = None
+keys_col = None
+shared_col = None
+_inflight = {}
+
+@asynccontextmanager
+async def lifespan(app):
+    global http, mongo, keys_col, shared_col
+    core.init()
+    limits = httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_KEEPALIVE)
+    http = httpx.AsyncClient(limits=limits, headers={"User-Agent": "NeonOSINT/1.0", "Accept-Encoding": "gzip, deflate"})
+    mongo = AsyncMongoClient(core.MONGO_URI)
+    db = mongo[core.DB_NAME]
+    keys_col = db[core.KEYS_COLL_NAME]
+    shared_col = db[core.L2_CACHE_COLL_NAME] if core._shared_cache else None
+    try:
+        yield
+    finally:
+        await http.aclose()
+        await mongo.close()
+
+async def fetch_upstream_raw(num, timeout, template=None):
+    if not core.API_URL:
+        return {"ok": False, "error": "no_api_url", "elapsed": 0.0}
+    url = (template or core.API_URLS[0]).format(num=num)
+    t0 = time.time()
+    try:
+        resp = await http.get(url, timeout=timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        return {"ok": True, "data": data, "elapsed": time.time() - t0}
+    except httpx.TimeoutException:
+        return {"ok": False, "error": "timeout", "elapsed": time.time() - t0}
+    except httpx.HTTPStatusError as e:
+        return {"ok": False, "error": f"request:{type(e).__name__}", "status": e.response.status_code, "elapsed": time.time() - t0}
+    except httpx.HTTPError as e:
+        return {"ok": False, "error": f"request:{type(e).__name__}", "elapsed": time.time() - t0}
+    except ValueError:
+        return {"ok": False, "error": "invalid_json", "elapsed": time.time() - t0}
+
+async def attempt(endpoint, num, timeout):
+    payload = await fetch_upstream_raw(num, timeout, endpoint.template)
+    core._upstreams.finish(endpoint, payload)
+    return payload
+
+async def fetch_routed(num, timeout):
+    first = core._upstreams.pick()
+    if first is None:
+        return await fetch_upstream_raw(num, timeout)
+    delay = core._latency.hedge_delay() if core.UPSTREAM_HEDGE and len(core._upstreams) > 1 else None
+    if delay is None or delay >= timeout:
+        return await attempt(first, num, timeout)
+    t0 = time.time()
+    tasks = [asyncio.ensure_future(attempt(first, num, timeout))]
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    if not done:
+        second = core._upstreams.pick(exclude=first, hedge=True)
+        if second is not None:
+            tasks.append(asyncio.ensure_future(attempt(second, num, max(0.1, timeout - delay))))
+    pending = set(tasks)
+    payload = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            payload = task.result()
+            if payload.get("ok"):
+                if task is not tasks[0]:
+                    core._upstreams.hedge_won()
+                return dict(payload, elapsed=time.time() - t0)
+    return dict(payload, elapsed=time.time() - t0)
+
+async def resolve_upstream(num, timeout):
+    disk = core._disk_cache
+    if disk:
+        hit = await asyncio.to_thread(disk.get, num)
+        if hit is not None:
+            return core._promote_cached(num, hit)
+    shared = core._shared_cache
+    if shared_col is not None:
+        try:
+            hit = shared.decode(await shared_col.find_one(shared.fresh_query(num)))
+        except Exception:
+            shared.count("errors")
+            hit = None
+        if hit is not None:
+            if disk:
+                await asyncio.to_thread(disk.set, num, hit[2], hit[0], hit[1], core._cache_policy(hit[2])[1])
+            return core._promote_cached(num, hit)
+    now_ts = time.time()
+    admitted = core._breaker.allow()
+    if admitted:
+        timeout = core._upstream_timeout(admitted, timeout)
+        payload = core._record_upstream(await fetch_routed(num, timeout), timeout)
+    else:
+        payload = core._circuit_open()
+    ttl, stale_ttl = core._cache_policy(payload)
+    if ttl > 0:
+        prepared = core.prepare_cached(payload)
+        core._upstream_cache.set(num, prepared, now_ts, ttl, stale_ttl, replace_ok=stale_ttl is None)
+        if disk:
+            await asyncio.to_thread(disk.set, num, payload, now_ts, ttl, stale_ttl)
+        if shared_col is not None:
+            try:
+                await shared_col.replace_one({"_id": num}, shared.encode(payload, now_ts, ttl), upsert=True)
+                shared.count("writes")
+            except Exception:
+                shared.count("errors")
+        return prepared
+    return payload
+
+def join_flight(num, timeout):
+    task = _inflight.get(num)
+    if task is None:
+        task = asyncio.ensure_future(resolve_upstream(num, timeout))
+        _inflight[num] = task
+        task.add_done_callback(lambda t: _inflight.pop(num, None) if _inflight.get(num) is t else None)
+    return task
+
+async def fetch_upstream_ex(num, timeout=core.UPSTREAM_TIMEOUT):
+    cached = core._upstream_cache.get_entry(num)
+    if cached is not None:
+        payload, stale = cached
+        if stale:
+            join_flight(num, timeout)
+        return payload, True
+    try:
+        return await asyncio.wait_for(asyncio.shield(join_flight(num, timeout)), timeout + 1), False
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": "timeout", "elapsed": timeout + 1}, False
+    except Exception as ex:
+        return {"ok": False, "error": f"executor:{type(ex).__name__}", "elapsed": 0.0}, False
+
+async def fetch_upstream(num, timeout=core.UPSTREAM_TIMEOUT):
+    return (await fetch_upstream_ex(num, timeout))[0]
+
+async def get_key_doc(key):
+    found, doc = core._key_cache.get(key)
+    if found:
+        return doc
+    generation = core._key_cache.generation
+    doc = core.prepare_key_doc(await keys_col.find_one({"key": key}))
+    core._key_cache.set(key, doc, generation)
+    return doc
+
+async def check_api_key(key):
+    doc = await get_key_doc(key)
+    return doc, core._key_denial(doc)
+
+def with_retry_after(resp, payload, headers=None):
+    if payload.get("retry_after"):
+        resp.headers["Retry-After"] = str(payload["retry_after"])
+    if headers:
+        resp.headers.update(headers)
+    return resp
+
+async def lookup(request):
+    form = parse_qs((await request.body()).decode("utf-8", "replace"))
+    num = core.normie_num(form.get("number", [""])[0])
+    if not num:
+        return JSONResponse({"error": "Invalid number format"}, 400)
+    if not core.API_URL:
+        return JSONResponse({"error": "API backend not configured"}, 500)
+    payload = await fetch_upstream(num)
+    core.log_request("lookup", num, payload)
+    body, status = core.render(payload, "lookup")
+    return with_retry_after(Response(body, status, media_type="application/json"), payload)
+
+async def number_to_info(request):
+    key = request.query_params.get("apikey", "")
+    raw_number = request.query_params.get("number", "")
+    if not key:
+        return JSONResponse({"error": "Missing apikey"}, 400)
+    if not raw_number:
+        return JSONResponse({"error": "Missing number parameter"}, 400)
+    doc, denied = await check_api_key(key)
+    if denied:
+        return JSONResponse(denied[0], denied[1])
+    num = core.normie_num(raw_number)
+    if not num:
+        return JSONResponse({"error": "Invalid number format"}, 400)
+    if not core.API_URL:
+        return JSONResponse({"error": "API backend not configured"}, 500)
+    retry_after, limit_headers = core._limiter.check(key, doc)
+    if retry_after:
+        resp = JSONResponse({"error": "Rate limit or quota exceeded. Contact @UseSir to upgrade."}, 429)
+        return with_retry_after(resp, {"retry_after": retry_after}, limit_headers)
+    payload, cache_hit = await fetch_upstream_ex(num)
+    core.log_request("api", num, payload)
+    body, status = core.render(payload, "api")
+    core._meter.record(key, doc.get("name"), status, cache_hit, payload.get("elapsed"))
+    return with_retry_after(Response(body, status, media_type="application/json"), payload, limit_headers)
+
+app = Starlette(
+    routes=[
+        Route("/lookup", lookup, methods=["POST"]),
+        Route("/number-to-info", number_to_info, methods=["GET"]),
+        Mount("/", WSGIMiddleware(core.app)),
+    ],
+    lifespan=lifespan,
+)
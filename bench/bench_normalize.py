@@ -0,0 +1,48 @@
+import argparse, os, random, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from normalize import normie_num, normie_num_bulk
+
+FORMATS = ("{n}", "+91{n}", "+91 {a} {b}", "0{n}", "0091{n}", "91-{n}", "({a}) {b}", "{n}x", "12345", "{p}-{n}", "{p} -- {a} {b}")
+EDGE_CASES = ("111111111111111-9999999888", "99999999-99999999-9876543210", "", "-", "9" * 40)
+
+def sample(count, seed):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(count):
+        n = rnd.choice("123456789") + "".join(rnd.choice("0123456789") for _ in range(9))
+        p = "".join(rnd.choice("0123456789") for _ in range(rnd.randint(1, 20)))
+        out.append(rnd.choice(FORMATS).format(n=n, a=n[:5], b=n[5:], p=p))
+    return out
+
+def count_mismatches(scalar, nums, valid):
+    return sum(1 for s, n, v in zip(scalar, nums, valid) if (s or "") != (n if v else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare normie_num with normie_num_bulk")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    raws = sample(args.count, args.seed)
+    t0 = time.perf_counter()
+    scalar = [normie_num(r) for r in raws]
+    t_scalar = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    nums, valid = normie_num_bulk(raws)
+    t_bulk = time.perf_counter() - t0
+    arr = np.asarray(raws, dtype=np.str_)
+    t0 = time.perf_counter()
+    normie_num_bulk(arr)
+    t_array = time.perf_counter() - t0
+    mismatches = count_mismatches(scalar, nums, valid)
+    for raw in EDGE_CASES:
+        mismatches += count_mismatches([normie_num(raw)], *normie_num_bulk([raw]))
+    print(f"rows={args.count} valid={int(valid.sum())} mismatches={mismatches}")
+    print(f"scalar {t_scalar:.3f}s ({args.count / t_scalar:,.0f}/s)")
+    print(f"bulk   {t_bulk:.3f}s ({args.count / t_bulk:,.0f}/s) speedup x{t_scalar / t_bulk:.1f}")
+    print(f"bulk (ndarray input) {t_array:.3f}s ({args.count / t_array:,.0f}/s) speedup x{t_scalar / t_array:.1f}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import argparse, importlib, json, logging, multiprocessing, os, random, sys, threading, time, datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_KEY = "bench-key"
+SCENARIOS = ("lookup", "api", "index", "favicon")
+
+class StubUpstream(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency_ms = 50.0
+    jitter = 0.5
+    error_rate = 0.0
+    padding = ""
+
+    def do_GET(self):
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms * random.lognormvariate(0, self.jitter) / 1000.0)
+        if random.random() < self.error_rate:
+            status, body = 500, b'{"error":"stub"}'
+        else:
+            num = self.path.rsplit("/", 1)[-1]
+            status = 200
+            body = json.dumps({"name": "Bench User", "mobile": num, "circle": "STUB", "address": self.padding, "Channel": "stub"}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub(latency_ms, jitter, error_rate, payload_bytes):
+    handler = type("Stub", (StubUpstream,), {"latency_ms": latency_ms, "jitter": jitter, "error_rate": error_rate, "padding": "x" * payload_bytes})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server.server_address[1]
+
+class FakeResult:
+    def __init__(self, n=0, inserted_id=None):
+        self.matched_count = self.modified_count = self.deleted_count = n
+        self.inserted_id = inserted_id
+        self.upserted_id = None
+
+class FakeCursor(list):
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        return FakeCursor(self[:n])
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _match(doc, filt):
+        return all(doc.get(k) == v for k, v in (filt or {}).items() if not isinstance(v, dict))
+
+    def find_one(self, filt=None, *args, **kwargs):
+        with self._lock:
+            for doc in self.docs:
+                if self._match(doc, filt):
+                    return dict(doc)
+        return None
+
+    def find(self, filt=None, *args, **kwargs):
+        with self._lock:
+            return FakeCursor(dict(d) for d in self.docs if self._match(d, filt))
+
+    def insert_one(self, doc):
+        with self._lock:
+            self.docs.append(dict(doc))
+        return FakeResult(1, doc.get("_id"))
+
+    def _noop(self, *args, **kwargs):
+        return FakeResult()
+
+    update_one = update_many = replace_one = delete_one = delete_many = bulk_write = _noop
+
+    def create_index(self, *args, **kwargs):
+        return "noop"
+
+    def aggregate(self, *args, **kwargs):
+        return iter(())
+
+    def count_documents(self, filt=None):
+        return len(self.find(filt))
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        coll = self[name] = FakeCollection()
+        return coll
+
+class FakeClient:
+    def __init__(self, *args, **kwargs):
+        self._dbs = {}
+
+    def __getitem__(self, name):
+        return self._dbs.setdefault(name, FakeDatabase())
+
+    def close(self):
+        pass
+
+def serve(env, stub, ready):
+    os.environ.update(env)
+    os.environ.update({"TELEGRAM_TOKEN": "", "UPSTREAM_L2_CACHE": "0", "MONGO_URI": "mongodb://bench.invalid"})
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    os.environ["API_URL"] = f"http://127.0.0.1:{start_stub(*stub)}/{{num}}"
+    os.chdir(ROOT)
+    core = importlib.import_module("2")
+    core.MongoClient = FakeClient
+    core.init()
+    core.keys_col.insert_one({"key": BENCH_KEY, "name": "bench", "active": True,
+                              "expires_at": datetime.datetime.utcnow() + datetime.timedelta(days=365)})
+    logging.getLogger("neonosint").setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, core.app, threaded=True)
+    ready.put(server.server_port)
+    server.serve_forever()
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+def send(scenario, session, base, numbers):
+    if scenario == "lookup":
+        return session.post(f"{base}/lookup", data={"number": random.choice(numbers)})
+    if scenario == "api":
+        return session.get(f"{base}/number-to-info", params={"apikey": BENCH_KEY, "number": random.choice(numbers)})
+    if scenario == "index":
+        return session.get(f"{base}/", headers={"Accept-Encoding": "br, gzip"})
+    return session.get(f"{base}/favicon.ico", headers={"Accept-Encoding": "br, gzip"})
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))]
+
+def run_level(scenario, concurrency, duration, base, numbers):
+    deadline = time.perf_counter() + duration
+    def worker(_):
+        session = requests.Session()
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                ok = send(scenario, session, base, numbers).status_code < 400
+            except requests.RequestException:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            errors += not ok
+        return latencies, errors
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies = sorted(l for lat, _ in results for l in lat)
+    return {"scenario": scenario, "concurrency": concurrency, "requests": len(latencies), "errors": sum(e for _, e in results),
+            "rps": len(latencies) / elapsed, "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000}
+
+def compare(results, baseline, tolerance, slack_ms):
+    base = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    failures = []
+    for r in results:
+        b = base.get((r["scenario"], r["concurrency"]))
+        if b is None:
+            continue
+        label = f"{r['scenario']}@{r['concurrency']}"
+        if r["rps"] < b["rps"] * (1 - tolerance):
+            failures.append(f"{label}: rps {r['rps']:.0f} < baseline {b['rps']:.0f}")
+        for field in ("p95_ms", "p99_ms"):
+            if r[field] > b[field] * (1 + tolerance) + slack_ms:
+                failures.append(f"{label}: {field} {r[field]:.1f} > baseline {b[field]:.1f}")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the app against a local stub upstream and report throughput, latency and memory")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client concurrency levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario and level")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--numbers", type=int, default=1000, help="distinct numbers queried (controls the cache hit ratio)")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0, help="median stub latency")
+    parser.add_argument("--upstream-jitter", type=float, default=0.5, help="lognormal sigma of stub latency")
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=512)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="app setting, e.g. THREADPOOL_MAX=16 (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="fail if results regress against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="absolute latency slack added to the tolerance")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    env = dict(item.split("=", 1) for item in args.env)
+    stub = (args.upstream_latency_ms, args.upstream_jitter, args.upstream_error_rate, args.payload_bytes)
+    ready = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=serve, args=(env, stub, ready), daemon=True)
+    proc.start()
+    base = f"http://127.0.0.1:{ready.get(timeout=60)}"
+    numbers = [str(9000000000 + random.randrange(1000000000)) for _ in range(args.numbers)]
+    results = []
+    try:
+        for scenario in args.scenarios.split(","):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                if args.warmup > 0:
+                    run_level(scenario, concurrency, args.warmup, base, numbers)
+                row = run_level(scenario, concurrency, args.duration, base, numbers)
+                row["rss_mb"], row["peak_rss_mb"] = rss_mb(proc.pid)
+                results.append(row)
+                mem = f"rss {row['rss_mb']:.1f}MB" if row["rss_mb"] is not None else "rss n/a"
+                print(f"{scenario:8} c={concurrency:<4} {row['rps']:8.0f} req/s  p50 {row['p50_ms']:7.1f}ms  p95 {row['p95_ms']:7.1f}ms  "
+                      f"p99 {row['p99_ms']:7.1f}ms  errors {row['errors']}  {mem}")
+    finally:
+        proc.terminate()
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            failures = compare(results, json.load(f), args.tolerance, args.slack_ms)
+        for line in failures:
+            print("REGRESSION " + line)
+        return 1 if failures else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
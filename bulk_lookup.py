@@ -0,0 +1,136 @@
+import argparse, csv, importlib, json, os, sqlite3, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from normalize import normie_num_bulk
+
+RETRYABLE = ("overloaded", "circuit_open", "timeout")
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next, now)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+class Checkpoint:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen (num TEXT PRIMARY KEY)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS state (k TEXT PRIMARY KEY, v TEXT)")
+        self.db.commit()
+
+    def get(self, k, default=None):
+        row = self.db.execute("SELECT v FROM state WHERE k = ?", (k,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def claim(self, nums):
+        fresh = []
+        for num in nums:
+            if self.db.execute("INSERT OR IGNORE INTO seen (num) VALUES (?)", (num,)).rowcount:
+                fresh.append(num)
+        return fresh
+
+    def commit(self, **state):
+        self.db.executemany("INSERT OR REPLACE INTO state (k, v) VALUES (?, ?)", [(k, json.dumps(v)) for k, v in state.items()])
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+def read_chunks(path, offset, chunk_size, column):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        raws = []
+        for line in f:
+            offset += len(line)
+            text = line.decode("utf-8", "replace").strip()
+            if column is not None and text:
+                row = next(csv.reader([text]), [])
+                text = row[column] if column < len(row) else ""
+            if text:
+                raws.append(text)
+            if len(raws) >= chunk_size:
+                yield raws, offset
+                raws = []
+        if raws:
+            yield raws, offset
+
+def resolve(core, num, limiter, timeout, retries):
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        payload = core.fetch_upstream(num, timeout)
+        if payload.get("ok") or payload.get("error") not in RETRYABLE or attempt == retries:
+            return payload
+        time.sleep(payload.get("retry_after") or min(30, 2 ** attempt))
+    return payload
+
+def to_line(core, num, payload):
+    if not payload.get("ok"):
+        return {"number": num, "ok": False, "error": payload.get("error")}
+    data = core._strip_channel(payload.get("data"))
+    if core._is_empty_data(data):
+        return {"number": num, "ok": False, "error": "no_data"}
+    return {"number": num, "ok": True, "data": data}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resolve a file of numbers through the Neon OSINT upstream pipeline")
+    parser.add_argument("input", help="text file with one number per line, or CSV with --column")
+    parser.add_argument("output", help="JSONL file results are appended to; on resume it is cut back to the last checkpoint")
+    parser.add_argument("--checkpoint", help="progress database (default: <output>.ckpt)")
+    parser.add_argument("--column", type=int, help="0-based CSV column holding the number")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0, help="max upstream lookups per second (0 = unlimited)")
+    parser.add_argument("--chunk", type=int, default=1000, help="numbers per checkpoint")
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    core = importlib.import_module("2")
+    core.init()
+    timeout = args.timeout or core.UPSTREAM_TIMEOUT
+    ckpt = Checkpoint(args.checkpoint or args.output + ".ckpt")
+    offset = ckpt.get("offset", 0)
+    out_size = ckpt.get("output_size")
+    if out_size is None:
+        out_size = os.path.getsize(args.output) if os.path.exists(args.output) else 0
+        ckpt.commit(output_size=out_size)
+    stats = ckpt.get("stats", {"read": 0, "invalid": 0, "duplicate": 0, "ok": 0, "failed": 0})
+    if offset:
+        print(f"resuming at byte {offset} ({stats['read']} rows done)", file=sys.stderr)
+    limiter = RateLimiter(args.rate)
+    mode = "r+b" if os.path.exists(args.output) else "wb"
+    with open(args.output, mode) as out, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        out.truncate(out_size)
+        out.seek(out_size)
+        for raws, next_offset in read_chunks(args.input, offset, args.chunk, args.column):
+            nums, valid = normie_num_bulk(raws)
+            stats["read"] += len(raws)
+            stats["invalid"] += int(len(raws) - valid.sum())
+            unique = list(dict.fromkeys(nums[valid].tolist()))
+            fresh = ckpt.claim(unique)
+            stats["duplicate"] += int(valid.sum()) - len(fresh)
+            try:
+                for num, payload in zip(fresh, pool.map(lambda n: resolve(core, n, limiter, timeout, args.retries), fresh)):
+                    line = to_line(core, num, payload)
+                    stats["ok" if line["ok"] else "failed"] += 1
+                    out.write((json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+                out.flush()
+                os.fsync(out.fileno())
+            except BaseException:
+                ckpt.rollback()
+                raise
+            ckpt.commit(offset=next_offset, output_size=out.tell(), stats=stats)
+            print(f"{stats['read']} read, {stats['ok']} ok, {stats['failed']} failed, {stats['duplicate']} dup, {stats['invalid']} invalid", file=sys.stderr)
+    ckpt.commit(done=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
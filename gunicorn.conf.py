@@ -0,0 +1,17 @@
+import importlib, os, shutil, tempfile
+
+_metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "neonosint-metrics"))
+os.makedirs(_metrics_dir, exist_ok=True)
+
+preload_app = True
+
+def on_starting(server):
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+def post_fork(server, worker):
+    importlib.import_module("2").init()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,57 @@
+import re
+
+_NON_DIGIT = re.compile(r"\D")
+_VALID_NUM = re.compile(r"^[6-9]\d{9}$")
+
+def normie_num(raw: str):
+    digits = _NON_DIGIT.sub("", raw)
+    if len(digits) == 10:
+        num = digits
+    elif len(digits) == 11 and digits.startswith("0"):
+        num = digits[1:]
+    elif len(digits) == 12 and digits.startswith("91"):
+        num = digits[2:]
+    elif len(digits) == 13 and digits.startswith("0091"):
+        num = digits[4:]
+    elif len(digits) > 10 and digits[-10:].startswith(("6", "7", "8", "9")):
+        num = digits[-10:]
+    else:
+        return None
+    return num if _VALID_NUM.match(num) else None
+
+_TEN_DIGITS = 10 ** 10
+
+def normie_num_bulk(raws):
+    import numpy as np
+    arr = np.asarray(raws if isinstance(raws, np.ndarray) else list(raws), dtype=np.str_)
+    n = arr.shape[0]
+    out = np.full(n, "", dtype="<U10")
+    if n == 0:
+        return out, np.zeros(0, dtype=bool)
+    width = max(arr.dtype.itemsize // 4, 1)
+    columns = np.ascontiguousarray(arr).view(np.uint32).reshape(n, width).T
+    non_ascii = (columns > 127).any(axis=0)
+    count = np.zeros(n, dtype=np.int64)
+    tail = np.zeros(n, dtype=np.int64)
+    head4 = np.zeros(n, dtype=np.int64)
+    for i, col in enumerate(columns):
+        if i % 8 == 0:
+            tail %= _TEN_DIGITS
+        digit = (col - np.uint32(48)).astype(np.int64)
+        is_digit = (digit >= 0) & (digit <= 9)
+        if not is_digit.any():
+            continue
+        tail = np.where(is_digit, tail * 10 + digit, tail)
+        head4 = np.where(is_digit & (count < 4), head4 * 10 + digit, head4)
+        count += is_digit
+    tail %= _TEN_DIGITS
+    valid = (count >= 10) & (tail >= 6_000_000_000) & ~((count == 13) & (head4 == 91))
+    if valid.any():
+        idx = np.flatnonzero(valid)
+        digits = (tail[idx, None] // 10 ** np.arange(9, -1, -1, dtype=np.int64) % 10 + 48).astype(np.uint32)
+        out[idx] = np.ascontiguousarray(digits).view("<U10").ravel()
+    for i in np.flatnonzero(non_ascii):
+        num = normie_num(str(arr[i]))
+        out[i] = num or ""
+        valid[i] = num is not None
+    return out, valid